@@ -7,8 +7,14 @@ from smolagents.default_tools import DuckDuckGoSearchTool  # type: ignore
 from holosophos.utils import get_prompt
 from holosophos.tools import (
     CustomVisitWebpageTool,
+    RemoteSession,
+    create_remote_tools,
     remote_text_editor_tool,
     remote_bash_tool,
+    remote_start_job_tool,
+    remote_job_output_tool,
+    remote_job_status_tool,
+    remote_cancel_job_tool,
     hf_datasets_search_tool,
 )
 
@@ -25,17 +31,27 @@ def get_mle_solver_agent(
     planning_interval: Optional[int] = 6,
     max_print_outputs_length: int = 20000,
     verbosity_level: int = 2,
+    remote_session: Optional[RemoteSession] = None,
 ) -> CodeAgent:
+    tools = [
+        remote_bash_tool,
+        remote_text_editor_tool,
+        remote_start_job_tool,
+        remote_job_output_tool,
+        remote_job_status_tool,
+        remote_cancel_job_tool,
+    ]
+    if remote_session is not None:
+        tools = create_remote_tools(remote_session)
+    tools += [
+        hf_datasets_search_tool,
+        DuckDuckGoSearchTool(),
+        CustomVisitWebpageTool(),
+    ]
     return CodeAgent(
         name=NAME,
         description=DESCRIPTION,
-        tools=[
-            remote_bash_tool,
-            remote_text_editor_tool,
-            hf_datasets_search_tool,
-            DuckDuckGoSearchTool(),
-            CustomVisitWebpageTool(),
-        ],
+        tools=tools,
         model=model,
         add_base_tools=False,
         max_steps=max_steps,
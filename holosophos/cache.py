@@ -0,0 +1,168 @@
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from contextlib import closing
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL,
+    accessed_at REAL NOT NULL
+)
+"""
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+
+def hash_key(*parts: str) -> str:
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    def __init__(
+        self,
+        path: Path,
+        ttl: Optional[int] = None,
+        max_size: Optional[int] = None,
+        memory_size: int = 0,
+    ) -> None:
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.memory_size = memory_size
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._initialized = False
+        self._memory: OrderedDict[str, Tuple[bytes, Optional[float]]] = OrderedDict()
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.path), timeout=30)
+        if not self._initialized:
+            with self._lock:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(SCHEMA)
+                conn.commit()
+                self._initialized = True
+        return conn
+
+    def _get_from_memory(self, hashed_key: str, now: float) -> Optional[bytes]:
+        with self._lock:
+            item = self._memory.get(hashed_key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at < now:
+                self._memory.pop(hashed_key)
+                return None
+            self._memory.move_to_end(hashed_key)
+            self.stats.hits += 1
+            return value
+
+    def _set_to_memory(
+        self, hashed_key: str, value: bytes, expires_at: Optional[float]
+    ) -> None:
+        if not self.memory_size:
+            return
+        with self._lock:
+            self._memory[hashed_key] = (value, expires_at)
+            self._memory.move_to_end(hashed_key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[bytes]:
+        hashed_key = hash_key(key)
+        now = time.time()
+        value = self._get_from_memory(hashed_key, now)
+        if value is not None:
+            return value
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute(
+                "SELECT value, expires_at FROM entries WHERE key = ?", (hashed_key,)
+            ).fetchone()
+            if row is not None and row[1] is not None and row[1] < now:
+                conn.execute("DELETE FROM entries WHERE key = ?", (hashed_key,))
+                row = None
+            if row is None:
+                with self._lock:
+                    self.stats.misses += 1
+                return None
+            conn.execute(
+                "UPDATE entries SET accessed_at = ? WHERE key = ?", (now, hashed_key)
+            )
+        with self._lock:
+            self.stats.hits += 1
+        value = zlib.decompress(row[0])
+        self._set_to_memory(hashed_key, value, row[1])
+        return value
+
+    def set(self, key: str, value: bytes, ttl: Optional[int] = None) -> None:
+        ttl = ttl if ttl is not None else self.ttl
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+        hashed_key = hash_key(key)
+        compressed = zlib.compress(value)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                (hashed_key, compressed, len(compressed), expires_at, now),
+            )
+            self._evict(conn, now)
+        self._set_to_memory(hashed_key, value, expires_at)
+
+    def delete(self, key: str) -> None:
+        hashed_key = hash_key(key)
+        with self._lock:
+            self._memory.pop(hashed_key, None)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM entries WHERE key = ?", (hashed_key,))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM entries")
+
+    def __len__(self) -> int:
+        with closing(self._connect()) as conn:
+            count: int = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return count
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        evicted = conn.execute(
+            "DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at < ?",
+            (now,),
+        ).rowcount
+        if self.max_size is not None:
+            total_size = conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()[0]
+            if total_size > self.max_size:
+                rows = conn.execute(
+                    "SELECT key, size FROM entries ORDER BY accessed_at ASC"
+                ).fetchall()
+                keys = []
+                for key, size in rows:
+                    if total_size <= self.max_size:
+                        break
+                    keys.append((key,))
+                    total_size -= size
+                conn.executemany("DELETE FROM entries WHERE key = ?", keys)
+                evicted += len(keys)
+        if evicted:
+            with self._lock:
+                self.stats.evictions += evicted
@@ -0,0 +1,102 @@
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+from urllib.parse import urlparse
+
+import requests
+from urllib3.util.retry import Retry
+
+DEFAULT_TIMEOUT = 30
+POOL_CONNECTIONS = 16
+POOL_MAXSIZE = 16
+DEFAULT_HOST_CONCURRENCY = 8
+HOST_CONCURRENCY: Dict[str, int] = {
+    "export.arxiv.org": 2,
+    "api.semanticscholar.org": 2,
+}
+RETRY_STRATEGY = Retry(
+    total=3,
+    backoff_factor=3,
+    status_forcelist=[429, 500, 502, 503, 504],
+    allowed_methods=["GET", "HEAD"],
+)
+
+_lock = threading.Lock()
+_local = threading.local()
+_adapter: Optional[requests.adapters.HTTPAdapter] = None
+_host_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+
+
+def configure(
+    pool_connections: Optional[int] = None,
+    pool_maxsize: Optional[int] = None,
+    host_concurrency: Optional[Dict[str, int]] = None,
+    default_host_concurrency: Optional[int] = None,
+) -> None:
+    global _adapter, POOL_CONNECTIONS, POOL_MAXSIZE, DEFAULT_HOST_CONCURRENCY
+    with _lock:
+        if pool_connections is not None:
+            POOL_CONNECTIONS = pool_connections
+        if pool_maxsize is not None:
+            POOL_MAXSIZE = pool_maxsize
+        if host_concurrency is not None:
+            HOST_CONCURRENCY.update(host_concurrency)
+        if default_host_concurrency is not None:
+            DEFAULT_HOST_CONCURRENCY = default_host_concurrency
+        if _adapter is not None:
+            _adapter.close()
+        _adapter = None
+        _host_semaphores.clear()
+
+
+def _get_adapter() -> requests.adapters.HTTPAdapter:
+    global _adapter
+    with _lock:
+        if _adapter is None:
+            _adapter = requests.adapters.HTTPAdapter(
+                pool_connections=POOL_CONNECTIONS,
+                pool_maxsize=POOL_MAXSIZE,
+                max_retries=RETRY_STRATEGY,
+            )
+        return _adapter
+
+
+def get_session() -> requests.Session:
+    # Sessions are per thread, connection pools are shared by the whole process
+    adapter = _get_adapter()
+    session: Optional[requests.Session] = getattr(_local, "session", None)
+    if session is None or session.get_adapter("https://") is not adapter:
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _local.session = session
+    return session
+
+
+@contextmanager
+def host_slot(url: str) -> Iterator[None]:
+    host = urlparse(url).netloc
+    with _lock:
+        semaphore = _host_semaphores.get(host)
+        if semaphore is None:
+            limit = HOST_CONCURRENCY.get(host, DEFAULT_HOST_CONCURRENCY)
+            semaphore = threading.BoundedSemaphore(limit)
+            _host_semaphores[host] = semaphore
+    with semaphore:
+        yield
+
+
+def get(url: str, timeout: int = DEFAULT_TIMEOUT, **kwargs: Any) -> requests.Response:
+    with host_slot(url):
+        response = get_session().get(url, timeout=timeout, **kwargs)
+    return response
+
+
+@contextmanager
+def stream(
+    url: str, timeout: int = DEFAULT_TIMEOUT, **kwargs: Any
+) -> Iterator[requests.Response]:
+    # The host slot is held until the body is read
+    with host_slot(url):
+        with get_session().get(url, timeout=timeout, stream=True, **kwargs) as response:
+            yield response
@@ -0,0 +1,101 @@
+import os
+import json
+import time
+import fcntl
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+
+class InstancePool:
+    # A registry of warm instances shared by local processes through a locked file
+    def __init__(self, path: Path, idle_ttl: int) -> None:
+        self.path = path
+        self.idle_ttl = idle_ttl
+        self.lock_path = path.with_name(path.name + ".lock")
+
+    @contextmanager
+    def _locked(self) -> Iterator[Dict[str, Dict[str, Any]]]:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.lock_path, "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                entries: Dict[str, Dict[str, Any]] = {}
+                if self.path.exists():
+                    entries = json.loads(self.path.read_text())
+                yield entries
+                tmp_path = self.path.with_name(self.path.name + ".tmp")
+                tmp_path.write_text(json.dumps(entries, indent=2))
+                os.replace(tmp_path, self.path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _is_free(entry: Dict[str, Any]) -> bool:
+        pid = entry["leased_by"]
+        if pid is None:
+            return True
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            # The process that leased the instance is dead
+            return True
+        except PermissionError:
+            pass
+        return False
+
+    def add(self, instance_id: int, info: Dict[str, Any]) -> None:
+        with self._locked() as entries:
+            entries[str(instance_id)] = {
+                "info": info,
+                "leased_by": os.getpid(),
+                "released_at": None,
+            }
+
+    def lease(self) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._locked() as entries:
+            for entry in entries.values():
+                if not self._is_free(entry):
+                    continue
+                released_at = entry["released_at"] or now
+                if now - released_at > self.idle_ttl:
+                    continue
+                entry["leased_by"] = os.getpid()
+                info: Dict[str, Any] = entry["info"]
+                return info
+        return None
+
+    def release(self, instance_id: int) -> bool:
+        with self._locked() as entries:
+            entry = entries.get(str(instance_id))
+            if entry is None:
+                return False
+            entry["leased_by"] = None
+            entry["released_at"] = time.time()
+            return True
+
+    def remove(self, instance_id: int) -> None:
+        with self._locked() as entries:
+            entries.pop(str(instance_id), None)
+
+    def count_free(self) -> int:
+        with self._locked() as entries:
+            return sum(self._is_free(entry) for entry in entries.values())
+
+    def reap(self) -> List[Dict[str, Any]]:
+        # Removes free instances that were idle for too long and returns them
+        now = time.time()
+        reaped = []
+        with self._locked() as entries:
+            for instance_id, entry in list(entries.items()):
+                if not self._is_free(entry):
+                    continue
+                if entry["released_at"] is None:
+                    # Leased by a dead process, the idle time starts now
+                    entry["released_at"] = now
+                    entry["leased_by"] = None
+                    continue
+                if now - entry["released_at"] > self.idle_ttl:
+                    reaped.append(entries.pop(instance_id)["info"])
+        return reaped
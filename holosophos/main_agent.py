@@ -7,7 +7,12 @@ from phoenix.otel import register
 from openinference.instrumentation.smolagents import SmolagentsInstrumentor
 from dotenv import load_dotenv
 
-from holosophos.tools import text_editor_tool, bash_tool
+from holosophos.tools import (
+    text_editor_tool,
+    create_bash_tool,
+    BashSession,
+    RemoteSession,
+)
 from holosophos.agents import get_librarian_agent, get_mle_solver_agent
 from holosophos.utils import get_prompt
 
@@ -89,13 +94,17 @@ def run_main_agent(
         max_print_outputs_length=max_print_outputs_length,
         verbosity_level=verbosity_level,
     )
+    # Every run gets its own container and remote instance, so runs can be parallel
+    bash_session = BashSession()
+    remote_session = RemoteSession()
     mle_solver_agent = get_mle_solver_agent(
         model,
         max_print_outputs_length=max_print_outputs_length,
         verbosity_level=verbosity_level,
+        remote_session=remote_session,
     )
     agent = CodeAgent(
-        tools=[text_editor_tool, bash_tool],
+        tools=[text_editor_tool, create_bash_tool(bash_session)],
         managed_agents=[librarian_agent, mle_solver_agent],
         model=model,
         add_base_tools=False,
@@ -105,7 +114,11 @@ def run_main_agent(
         prompt_templates=get_prompt("system"),
         max_print_outputs_length=max_print_outputs_length,
     )
-    response: str = agent.run(query)
+    try:
+        response: str = agent.run(query)
+    finally:
+        bash_session.close()
+        remote_session.close()
     return response
 
 
@@ -0,0 +1,235 @@
+import os
+import re
+import time
+import uuid
+import queue
+import base64
+import threading
+import subprocess
+from abc import ABC, abstractmethod
+from typing import List, Optional, Tuple
+
+SENTINEL_PREFIX = "__HOLOSOPHOS_DONE_"
+START_TIMEOUT = 60
+INTERRUPT_TIMEOUT = 10
+READ_CHUNK_SIZE = 64 * 1024
+TRUNCATION_MESSAGE = "\n[... {size} bytes truncated ...]\n"
+# Background jobs of the shell are listed here before every command
+JOBS_FILE = "/tmp/.holosophos_shell_{pid}.jobs"
+# Kills process groups of the running command, background jobs started by earlier
+# commands are kept. Slim images have no pgrep, children are listed through /proc.
+KILL_CHILDREN_COMMAND = (
+    'children() {{ pgrep -P "$1" 2>/dev/null || cat /proc/"$1"/task/*/children; }}; '
+    'pgid() {{ s=$(cat /proc/"$1"/stat 2>/dev/null); s=${{s##*) }}; set -- $s; echo "$3"; }}; '
+    'kill_tree() {{ for c in $(children "$1"); do kill_tree "$c"; done; '
+    'kill -KILL "$1" 2>/dev/null; }}; '
+    "shell_group=$(pgid {pid}); "
+    'for c in $(children {pid}); do g=$(pgid "$c"); [ -n "$g" ] || continue; '
+    'grep -qx "$g" {jobs_file} 2>/dev/null && continue; '
+    'if [ "$g" = "$shell_group" ]; then kill_tree "$c"; '
+    'else kill -KILL -- -"$g" 2>/dev/null; fi; done; true'
+)
+
+
+def kill_children_command(pid: int) -> str:
+    jobs_file = JOBS_FILE.format(pid=pid)
+    return KILL_CHILDREN_COMMAND.format(pid=pid, jobs_file=jobs_file)
+
+
+class ShellSession(ABC):
+    # A long-lived bash process, commands and their exit codes are framed by sentinels
+    def __init__(self, max_output_size: Optional[int] = None) -> None:
+        self.pid: Optional[int] = None
+        # Only the head and the tail of a bigger output are kept while reading
+        self.max_output_size = max_output_size
+        self._chunks: "queue.Queue[Optional[bytes]]" = queue.Queue()
+        self._buffer = b""
+        self._head = b""
+        self._truncated_size = 0
+        self._lock = threading.Lock()
+        self._is_alive = False
+
+    @abstractmethod
+    def _open(self) -> None:
+        pass
+
+    @abstractmethod
+    def _read(self) -> bytes:
+        pass
+
+    @abstractmethod
+    def _write(self, data: bytes) -> None:
+        pass
+
+    @abstractmethod
+    def _kill_children(self) -> None:
+        pass
+
+    @abstractmethod
+    def _close(self) -> None:
+        pass
+
+    @property
+    def is_alive(self) -> bool:
+        return self._is_alive
+
+    def start(self) -> None:
+        self._chunks = queue.Queue()
+        self._buffer = b""
+        self._head = b""
+        self._truncated_size = 0
+        self._open()
+        self._is_alive = True
+        threading.Thread(
+            target=self._read_loop, args=(self._chunks,), daemon=True
+        ).start()
+        try:
+            # Job control puts every command and background job into its own group
+            marker = self._send("set -m; echo $$")
+            output, _ = self._wait(marker, START_TIMEOUT)
+            self.pid = int(output.strip())
+        except Exception:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        self._is_alive = False
+        self.pid = None
+        try:
+            self._close()
+        except Exception:
+            pass
+
+    def run(self, command: str, timeout: int = 60) -> Tuple[str, int]:
+        with self._lock:
+            if not self._is_alive:
+                self.start()
+            try:
+                marker = self._send(command)
+            except OSError:
+                self.close()
+                raise EOFError(f"Shell session terminated before running: {command}")
+            try:
+                return self._wait(marker, timeout)
+            except TimeoutError:
+                output = self._interrupt(marker)
+                raise TimeoutError(
+                    f"Command timed out after {timeout} seconds: {command}; "
+                    f"Output: {output}"
+                )
+            except EOFError:
+                self.close()
+                raise EOFError(f"Shell session terminated while running: {command}")
+
+    def _interrupt(self, marker: str) -> str:
+        try:
+            self._kill_children()
+            output, _ = self._wait(marker, INTERRUPT_TIMEOUT)
+            return output
+        except Exception:
+            self.close()
+        return ""
+
+    def _read_loop(self, chunks: "queue.Queue[Optional[bytes]]") -> None:
+        try:
+            while True:
+                chunk = self._read()
+                if not chunk:
+                    break
+                chunks.put(chunk)
+        except Exception:
+            pass
+        if chunks is self._chunks:
+            self._is_alive = False
+        chunks.put(None)
+
+    def _send(self, command: str) -> str:
+        # Commands are base64-encoded, so quotes and heredocs need no escaping
+        marker = f"{SENTINEL_PREFIX}{uuid.uuid4().hex}__"
+        encoded = base64.b64encode(command.encode("utf-8")).decode("ascii")
+        jobs_file = JOBS_FILE.format(pid="$$")
+        line = (
+            f"jobs -p > {jobs_file} 2>/dev/null; "
+            f"eval \"$(printf %s '{encoded}' | base64 -d)\" < /dev/null 2>&1; "
+            f"printf '\\n{marker}%s\\n' \"$?\"\n"
+        )
+        self._write(line.encode("utf-8"))
+        return marker
+
+    def _wait(self, marker: str, timeout: float) -> Tuple[str, int]:
+        pattern = re.compile(b"\n" + marker.encode("ascii") + rb"(-?\d+)\n")
+        deadline = time.monotonic() + timeout
+        while True:
+            match = pattern.search(self._buffer)
+            if match:
+                output = self._buffer[: match.start()]
+                self._buffer = self._buffer[match.end() :]
+                if self._truncated_size:
+                    message = TRUNCATION_MESSAGE.format(size=self._truncated_size)
+                    output = self._head + message.encode("utf-8") + output
+                self._head = b""
+                self._truncated_size = 0
+                return output.decode("utf-8", errors="replace"), int(match.group(1))
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError()
+            try:
+                chunk = self._chunks.get(timeout=remaining)
+            except queue.Empty:
+                raise TimeoutError()
+            if chunk is None:
+                raise EOFError()
+            self._buffer += chunk
+            if self.max_output_size and len(self._buffer) > self.max_output_size:
+                self._truncate()
+
+    def _truncate(self) -> None:
+        # The tail is longer than the sentinel, so a split sentinel is kept whole
+        assert self.max_output_size
+        head_size = self.max_output_size // 2
+        if not self._truncated_size:
+            self._head = self._buffer[:head_size]
+            self._buffer = self._buffer[head_size:]
+        tail_size = self.max_output_size - head_size
+        self._truncated_size += len(self._buffer) - tail_size
+        self._buffer = self._buffer[-tail_size:]
+
+
+class ProcessShellSession(ShellSession):
+    def __init__(self, args: List[str], max_output_size: Optional[int] = None) -> None:
+        super().__init__(max_output_size)
+        self.args = args
+        self._process: Optional["subprocess.Popen[bytes]"] = None
+
+    def _open(self) -> None:
+        self._process = subprocess.Popen(
+            self.args,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            bufsize=0,
+        )
+
+    def _read(self) -> bytes:
+        assert self._process and self._process.stdout
+        return os.read(self._process.stdout.fileno(), READ_CHUNK_SIZE)
+
+    def _write(self, data: bytes) -> None:
+        assert self._process and self._process.stdin
+        self._process.stdin.write(data)
+        self._process.stdin.flush()
+
+    def _kill_children(self) -> None:
+        assert self.pid
+        subprocess.run(
+            ["bash", "-c", kill_children_command(self.pid)],
+            capture_output=True,
+            timeout=INTERRUPT_TIMEOUT,
+        )
+
+    def _close(self) -> None:
+        if self._process is None:
+            return
+        self._process.kill()
+        self._process.wait()
+        self._process = None
@@ -1,21 +1,53 @@
-from typing import Callable, Any
+import inspect
+from typing import Callable, Any, List
 
 from smolagents.tools import tool, Tool  # type: ignore
 
 from holosophos.tools.arxiv_search import arxiv_search
 from holosophos.tools.anthology_search import anthology_search
 from holosophos.tools.arxiv_download import arxiv_download
-from holosophos.tools.bash import bash
+from holosophos.tools.bash import bash, BashSession, bind_bash_tool
 from holosophos.tools.text_editor import text_editor
 from holosophos.tools.document_qa import DocumentQATool
 from holosophos.tools.visit_webpage import CustomVisitWebpageTool
-from holosophos.tools.remote_gpu import remote_bash, create_remote_text_editor
+from holosophos.tools.remote_gpu import (
+    RemoteSession,
+    InstanceScheduler,
+    configure_scheduler,
+    bind_remote_tool,
+    remote_bash,
+    create_remote_text_editor,
+    remote_start_job,
+    remote_job_output,
+    remote_job_status,
+    remote_cancel_job,
+)
 from holosophos.tools.hf_datasets_search import hf_datasets_search
 from holosophos.tools.s2_citations import s2_citations
 
 
 def convert_tool_to_smolagents(function: Callable[..., Any]) -> Tool:
-    return tool(function)
+    # smolagents adds "self" to the signature of the function, it breaks later wrappers
+    signature = inspect.signature(function)
+    converted_tool = tool(function)
+    function.__signature__ = signature  # type: ignore
+    return converted_tool
+
+
+def create_remote_tools(session: RemoteSession) -> List[Tool]:
+    # Tools of one agent, all of them work with the instance of its session
+    return [
+        convert_tool_to_smolagents(bind_remote_tool(remote_bash, session)),
+        convert_tool_to_smolagents(create_remote_text_editor(text_editor, session)),
+        convert_tool_to_smolagents(bind_remote_tool(remote_start_job, session)),
+        convert_tool_to_smolagents(bind_remote_tool(remote_job_output, session)),
+        convert_tool_to_smolagents(bind_remote_tool(remote_job_status, session)),
+        convert_tool_to_smolagents(bind_remote_tool(remote_cancel_job, session)),
+    ]
+
+
+def create_bash_tool(session: BashSession) -> Tool:
+    return convert_tool_to_smolagents(bind_bash_tool(bash, session))
 
 
 remote_text_editor = create_remote_text_editor(text_editor)
@@ -27,6 +59,10 @@ bash_tool = convert_tool_to_smolagents(bash)
 text_editor_tool = convert_tool_to_smolagents(text_editor)
 remote_bash_tool = convert_tool_to_smolagents(remote_bash)
 remote_text_editor_tool = convert_tool_to_smolagents(remote_text_editor)
+remote_start_job_tool = convert_tool_to_smolagents(remote_start_job)
+remote_job_output_tool = convert_tool_to_smolagents(remote_job_output)
+remote_job_status_tool = convert_tool_to_smolagents(remote_job_status)
+remote_cancel_job_tool = convert_tool_to_smolagents(remote_cancel_job)
 hf_datasets_search_tool = convert_tool_to_smolagents(hf_datasets_search)
 s2_citations_tool = convert_tool_to_smolagents(s2_citations)
 
@@ -39,16 +75,30 @@ __all__ = [
     "DocumentQATool",
     "CustomVisitWebpageTool",
     "bash",
+    "BashSession",
+    "create_bash_tool",
     "text_editor",
     "arxiv_search_tool",
     "arxiv_download_tool",
     "anthology_search_tool",
     "bash_tool",
     "text_editor_tool",
+    "RemoteSession",
+    "InstanceScheduler",
+    "configure_scheduler",
+    "create_remote_tools",
     "remote_bash",
     "remote_text_editor",
     "remote_bash_tool",
     "remote_text_editor_tool",
+    "remote_start_job",
+    "remote_job_output",
+    "remote_job_status",
+    "remote_cancel_job",
+    "remote_start_job_tool",
+    "remote_job_output_tool",
+    "remote_job_status_tool",
+    "remote_cancel_job_tool",
     "hf_datasets_search",
     "hf_datasets_search_tool",
     "s2_citations",
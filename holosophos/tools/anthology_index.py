@@ -0,0 +1,395 @@
+import os
+import re
+import sys
+import json
+import mmap
+import math
+import heapq
+import bisect
+from array import array
+from pathlib import Path
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple, Union
+
+from holosophos.utils import tokenize
+
+MAGIC = b"HSANTIDX"
+SNAPSHOT_VERSION = 2
+RECORD_FIELDS = (
+    "id",
+    "title",
+    "authors",
+    "author_names",
+    "abstract",
+    "categories",
+    "comment",
+    "url",
+)
+SEARCH_FIELDS = {
+    "ti": "title",
+    "abs": "abstract",
+    "au": "author_names",
+    "cat": "categories",
+    "id": "id",
+}
+FIELDS = tuple(SEARCH_FIELDS.keys())
+RANKING_FIELD_WEIGHTS = {"ti": 2.0, "abs": 1.0}
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+Buffer = Union[bytes, memoryview]
+
+
+class StringColumn:
+    def __init__(self, data: Buffer, offsets: Sequence[int]) -> None:
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, strings: List[str]) -> "StringColumn":
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = array("Q", [0])
+        for item in encoded:
+            offsets.append(offsets[-1] + len(item))
+        return cls(b"".join(encoded), offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return bytes(self.data[start:end]).decode("utf-8")
+
+
+class Postings:
+    # Sorted vocabulary + flat doc id and term frequency arrays, looked up with a binary search
+    def __init__(
+        self,
+        vocabulary: StringColumn,
+        offsets: Sequence[int],
+        doc_ids: Sequence[int],
+        tfs: Sequence[int],
+    ) -> None:
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+
+    @classmethod
+    def from_dict(cls, postings: Dict[str, List[Tuple[int, int]]]) -> "Postings":
+        tokens = sorted(postings.keys())
+        offsets = array("Q", [0])
+        doc_ids = array("I")
+        tfs = array("H")
+        for token in tokens:
+            for doc_id, tf in postings[token]:
+                doc_ids.append(doc_id)
+                tfs.append(min(tf, 65535))
+            offsets.append(len(doc_ids))
+        return cls(StringColumn.from_strings(tokens), offsets, doc_ids, tfs)
+
+    def _find(self, token: str) -> Optional[Tuple[int, int]]:
+        token_id = bisect.bisect_left(self.vocabulary, token)
+        if token_id >= len(self.vocabulary) or self.vocabulary[token_id] != token:
+            return None
+        return self.offsets[token_id], self.offsets[token_id + 1]
+
+    def get(self, token: str) -> Sequence[int]:
+        bounds = self._find(token)
+        if bounds is None:
+            return []
+        return self.doc_ids[bounds[0] : bounds[1]]
+
+    def get_with_tfs(self, token: str) -> Tuple[Sequence[int], Sequence[int]]:
+        bounds = self._find(token)
+        if bounds is None:
+            return [], []
+        start, end = bounds
+        return self.doc_ids[start:end], self.tfs[start:end]
+
+
+class AnthologyIndex:
+    def __init__(
+        self,
+        columns: Dict[str, StringColumn],
+        years: Sequence[int],
+        postings: Dict[str, Postings],
+        lengths: Dict[str, Sequence[int]],
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self.columns = columns
+        self.years = years
+        self.postings = postings
+        self.lengths = lengths
+        self.metadata = metadata or dict()
+        self._avg_lengths: Dict[str, float] = dict()
+        self._mmap: Optional[mmap.mmap] = None
+
+    @classmethod
+    def from_records(
+        cls, records: List[Dict[str, Any]], metadata: Optional[Dict[str, Any]] = None
+    ) -> "AnthologyIndex":
+        columns = {
+            name: StringColumn.from_strings([r[name] for r in records])
+            for name in RECORD_FIELDS
+        }
+        years = array("H", [r["year"] for r in records])
+        postings: Dict[str, Postings] = dict()
+        lengths: Dict[str, Sequence[int]] = dict()
+        for field, column_name in SEARCH_FIELDS.items():
+            field_postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+            field_lengths = array("I")
+            for doc_id, record in enumerate(records):
+                tokens = tokenize(record[column_name])
+                field_lengths.append(len(tokens))
+                for token, tf in Counter(tokens).items():
+                    field_postings[token].append((doc_id, tf))
+            postings[field] = Postings.from_dict(field_postings)
+            lengths[field] = field_lengths
+        return cls(columns, years, postings, lengths, metadata)
+
+    def save(self, path: Path) -> None:
+        sections: List[Tuple[str, Buffer, str]] = [("years", bytes(self.years), "H")]
+        for name, column in self.columns.items():
+            sections.append((f"column.{name}", column.data, "B"))
+            sections.append((f"column.{name}.offsets", bytes(column.offsets), "Q"))
+        for field, field_postings in self.postings.items():
+            vocabulary = field_postings.vocabulary
+            sections.append((f"postings.{field}.vocabulary", vocabulary.data, "B"))
+            sections.append(
+                (f"postings.{field}.vocabulary.offsets", bytes(vocabulary.offsets), "Q")
+            )
+            sections.append(
+                (f"postings.{field}.offsets", bytes(field_postings.offsets), "Q")
+            )
+            sections.append(
+                (f"postings.{field}.doc_ids", bytes(field_postings.doc_ids), "I")
+            )
+            sections.append((f"postings.{field}.tfs", bytes(field_postings.tfs), "H"))
+            sections.append((f"lengths.{field}", bytes(self.lengths[field]), "I"))
+
+        offset = 0
+        layout: Dict[str, Tuple[int, int, str]] = dict()
+        for name, data, typecode in sections:
+            layout[name] = (offset, len(data), typecode)
+            offset += len(data) + (-len(data) % 8)
+        header = json.dumps(
+            {
+                "version": SNAPSHOT_VERSION,
+                "byteorder": sys.byteorder,
+                "metadata": self.metadata,
+                "sections": layout,
+            }
+        ).encode("utf-8")
+        header += b" " * (-len(header) % 8)
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Several processes can rebuild the snapshot at the same time
+        tmp_path = path.with_suffix(f"{path.suffix}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC)
+            f.write(len(header).to_bytes(8, "little"))
+            f.write(header)
+            for _, data, _ in sections:
+                f.write(data)
+                f.write(b"\0" * (-len(data) % 8))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "AnthologyIndex":
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mm)
+        if bytes(view[: len(MAGIC)]) != MAGIC:
+            raise ValueError(f"Not an anthology snapshot: {path}")
+        header_length = int.from_bytes(view[8:16], "little")
+        header = json.loads(bytes(view[16 : 16 + header_length]))
+        if header["version"] != SNAPSHOT_VERSION:
+            raise ValueError(f"Outdated anthology snapshot version: {path}")
+        if header["byteorder"] != sys.byteorder:
+            raise ValueError(f"Incompatible anthology snapshot byte order: {path}")
+
+        data_start = 16 + header_length
+
+        def section(name: str) -> memoryview:
+            offset, length, typecode = header["sections"][name]
+            start = data_start + offset
+            return view[start : start + length].cast(typecode)
+
+        columns = {
+            name: StringColumn(
+                section(f"column.{name}"), section(f"column.{name}.offsets")
+            )
+            for name in RECORD_FIELDS
+        }
+        postings = {
+            field: Postings(
+                StringColumn(
+                    section(f"postings.{field}.vocabulary"),
+                    section(f"postings.{field}.vocabulary.offsets"),
+                ),
+                section(f"postings.{field}.offsets"),
+                section(f"postings.{field}.doc_ids"),
+                section(f"postings.{field}.tfs"),
+            )
+            for field in FIELDS
+        }
+        lengths: Dict[str, Sequence[int]] = {
+            field: section(f"lengths.{field}") for field in FIELDS
+        }
+        index = cls(columns, section("years"), postings, lengths, header["metadata"])
+        index._mmap = mm
+        return index
+
+    def __len__(self) -> int:
+        return len(self.years)
+
+    def get_record(self, doc_id: int) -> Dict[str, Any]:
+        record: Dict[str, Any] = {
+            name: column[doc_id] for name, column in self.columns.items()
+        }
+        record["year"] = self.years[doc_id]
+        return record
+
+    def match(self, field: str, value: str) -> Set[int]:
+        if field == "all":
+            result: Set[int] = set()
+            for sub_field in FIELDS:
+                result |= self.match(sub_field, value)
+            return result
+        if field not in FIELDS:
+            return set()
+
+        tokens = tokenize(value)
+        if not tokens:
+            return set(range(len(self))) if not value.strip() else set()
+        field_postings = self.postings[field]
+        postings = sorted((field_postings.get(token) for token in set(tokens)), key=len)
+        candidates = set(postings[0])
+        for doc_ids in postings[1:]:
+            if not candidates:
+                break
+            candidates.intersection_update(doc_ids)
+
+        # Phrases and values with punctuation are verified against the raw field text
+        if len(tokens) > 1 or tokens[0] != value:
+            column = self.columns[SEARCH_FIELDS[field]]
+            candidates = {
+                doc_id for doc_id in candidates if value in column[doc_id].lower()
+            }
+        return candidates
+
+    @staticmethod
+    def parse_query(query: str) -> List[Tuple[Optional[str], str, str]]:
+        conditions = re.split(r"\s+(AND|OR|ANDNOT)\s+", query)
+        parsed_conditions: List[Tuple[Optional[str], str, str]] = []
+        for i in range(0, len(conditions), 2):
+            condition = conditions[i].strip("() ")
+            field, value = (
+                condition.split(":", 1) if ":" in condition else ("ti", condition)
+            )
+            value = value.lower().replace('"', "").replace("'", "")
+            operator = conditions[i - 1] if i > 0 else None
+            parsed_conditions.append((operator, field, value))
+        return parsed_conditions
+
+    def search(
+        self,
+        query: str,
+        start_year: Optional[int] = None,
+        end_year: Optional[int] = None,
+    ) -> Set[int]:
+        result: Set[int] = set()
+        for operator, field, value in self.parse_query(query):
+            match_found = self.match(field, value)
+            if operator is None:
+                result = match_found
+            elif operator == "AND":
+                result = result & match_found
+            elif operator == "OR":
+                result = result | match_found
+            elif operator == "ANDNOT":
+                result = result - match_found
+
+        if start_year is not None or end_year is not None:
+            start_year = start_year if start_year is not None else 0
+            end_year = end_year if end_year is not None else 10000
+            years = self.years
+            result = {
+                doc_id for doc_id in result if start_year <= years[doc_id] <= end_year
+            }
+        return result
+
+    def _avg_length(self, field: str) -> float:
+        if field not in self._avg_lengths:
+            lengths = self.lengths[field]
+            self._avg_lengths[field] = sum(lengths) / max(len(lengths), 1)
+        return self._avg_lengths[field]
+
+    def score(self, doc_ids: Set[int], query: str) -> Dict[int, float]:
+        field_terms: Dict[str, Set[str]] = defaultdict(set)
+        for operator, field, value in self.parse_query(query):
+            if operator == "ANDNOT":
+                continue
+            for ranking_field in RANKING_FIELD_WEIGHTS:
+                if field in (ranking_field, "all"):
+                    field_terms[ranking_field].update(tokenize(value))
+
+        num_docs = len(self)
+        scores: Dict[int, float] = defaultdict(float)
+        for field, terms in field_terms.items():
+            weight = RANKING_FIELD_WEIGHTS[field]
+            lengths = self.lengths[field]
+            avg_length = self._avg_length(field)
+            for term in terms:
+                term_doc_ids, term_tfs = self.postings[field].get_with_tfs(term)
+                df = len(term_doc_ids)
+                if df == 0:
+                    continue
+                idf = math.log(1.0 + (num_docs - df + 0.5) / (df + 0.5))
+                if len(doc_ids) < df:
+                    # Postings are sorted by doc id, so look up only the matched docs
+                    matches = []
+                    for doc_id in doc_ids:
+                        position = bisect.bisect_left(term_doc_ids, doc_id)
+                        if position < df and term_doc_ids[position] == doc_id:
+                            matches.append((doc_id, term_tfs[position]))
+                else:
+                    matches = [
+                        (doc_id, tf)
+                        for doc_id, tf in zip(term_doc_ids, term_tfs)
+                        if doc_id in doc_ids
+                    ]
+                for doc_id, tf in matches:
+                    norm = 1.0 - BM25_B + BM25_B * lengths[doc_id] / avg_length
+                    tf_score = tf * (BM25_K1 + 1.0) / (tf + BM25_K1 * norm)
+                    scores[doc_id] += weight * idf * tf_score
+        return scores
+
+    def rank(
+        self,
+        doc_ids: Set[int],
+        query: str,
+        limit: int,
+        sort_by: str = "relevance",
+        sort_order: str = "descending",
+    ) -> List[int]:
+        descending = sort_order == "descending"
+        if sort_by == "published":
+            years = self.years
+            if descending:
+                return heapq.nlargest(
+                    limit, doc_ids, key=lambda doc_id: (years[doc_id], -doc_id)
+                )
+            return heapq.nsmallest(
+                limit, doc_ids, key=lambda doc_id: (years[doc_id], doc_id)
+            )
+
+        scores = self.score(doc_ids, query)
+        if descending:
+            return heapq.nlargest(
+                limit, doc_ids, key=lambda doc_id: (scores.get(doc_id, 0.0), -doc_id)
+            )
+        return heapq.nsmallest(
+            limit, doc_ids, key=lambda doc_id: (scores.get(doc_id, 0.0), doc_id)
+        )
@@ -1,10 +1,22 @@
 import json
 import re
+import time
+import threading
+import subprocess
 from datetime import datetime
+from pathlib import Path
 from typing import Optional, List, Dict, Any
 
+import fire  # type: ignore
 from acl_anthology import Anthology
 
+from holosophos.files import CACHE_DIR_PATH
+from holosophos.tools.anthology_index import AnthologyIndex
+
+ANTHOLOGY_REPO_URL = "https://github.com/acl-org/acl-anthology.git"
+SNAPSHOT_PATH = CACHE_DIR_PATH / "anthology_snapshot.bin"
+SNAPSHOT_CHECK_INTERVAL = 24 * 60 * 60
+
 
 class AnthologySingleton:
     instance: Optional[Anthology] = None
@@ -12,11 +24,53 @@ class AnthologySingleton:
     @classmethod
     def get(cls) -> Anthology:
         if cls.instance is None:
-            cls.instance = Anthology.from_repo()
+            cls.instance = Anthology.from_repo(repo_url=ANTHOLOGY_REPO_URL)
             cls.instance.load_all()
         return cls.instance
 
 
+class AnthologyIndexSingleton:
+    instance: Optional[AnthologyIndex] = None
+    refresh_thread: Optional[threading.Thread] = None
+    lock = threading.Lock()
+
+    @classmethod
+    def get(cls) -> AnthologyIndex:
+        with cls.lock:
+            if cls.instance is not None:
+                return cls.instance
+
+            snapshot: Optional[AnthologyIndex] = None
+            try:
+                snapshot = AnthologyIndex.load(SNAPSHOT_PATH)
+            except (OSError, ValueError, KeyError):
+                pass
+
+            if snapshot is None:
+                cls.instance = build_anthology_snapshot()
+                return cls.instance
+
+            # The existing snapshot is served while a newer one is built
+            cls.instance = snapshot
+            cls.refresh_thread = threading.Thread(
+                target=cls.refresh, args=(snapshot,), daemon=True
+            )
+            cls.refresh_thread.start()
+            return cls.instance
+
+    @classmethod
+    def refresh(cls, snapshot: AnthologyIndex) -> None:
+        try:
+            if _is_snapshot_fresh(snapshot):
+                return
+            index = build_anthology_snapshot()
+        except Exception as e:
+            print(f"Failed to refresh the Anthology snapshot, using the old one: {e}")
+            return
+        with cls.lock:
+            cls.instance = index
+
+
 SORT_BY_OPTIONS = ("relevance", "published")
 SORT_ORDER_OPTIONS = ("ascending", "descending")
 
@@ -40,21 +94,82 @@ def _format_date(date_str: str) -> str:
         return date_str
 
 
-def _clean_entry(entry: Any) -> Dict[str, Any]:
+def _extract_record(paper: Any) -> Dict[str, Any]:
+    author_names = [
+        " ".join(part for part in (author.name.first, author.name.last) if part)
+        for author in paper.authors
+    ]
     return {
-        "id": entry.full_id,
-        "title": _format_text_field(entry.title.as_text()),
-        "authors": _format_authors(entry.authors),
+        "id": paper.full_id,
+        "title": _format_text_field(paper.title.as_text()),
+        "authors": _format_authors(paper.authors),
+        "author_names": "\n".join(author_names),
         "abstract": (
-            _format_text_field(entry.abstract.as_text()) if entry.abstract else ""
+            _format_text_field(paper.abstract.as_text()) if paper.abstract else ""
         ),
-        "published": _format_date(entry.year),
-        "categories": ", ".join(entry.venue_ids),
-        "comment": entry.note if entry.note else "",
-        "url": entry.pdf.url if entry.pdf else "",
+        "year": int(paper.year),
+        "categories": ", ".join(paper.venue_ids),
+        "comment": paper.note if paper.note else "",
+        "url": paper.pdf.url if paper.pdf else "",
+    }
+
+
+def _clean_entry(entry: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": entry["id"],
+        "title": entry["title"],
+        "authors": entry["authors"],
+        "abstract": entry["abstract"],
+        "published": _format_date(str(entry["year"])),
+        "categories": entry["categories"],
+        "comment": entry["comment"],
+        "url": entry["url"],
     }
 
 
+def _run_git(*args: str) -> Optional[str]:
+    try:
+        result = subprocess.run(
+            ["git", *args], capture_output=True, text=True, timeout=30
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0 or not result.stdout.strip():
+        return None
+    return result.stdout.split()[0]
+
+
+def _is_snapshot_fresh(snapshot: AnthologyIndex) -> bool:
+    check_path = SNAPSHOT_PATH.with_suffix(".checked")
+    if (
+        check_path.exists()
+        and time.time() - check_path.stat().st_mtime < SNAPSHOT_CHECK_INTERVAL
+    ):
+        return True
+    upstream_commit = _run_git("ls-remote", ANTHOLOGY_REPO_URL, "HEAD")
+    if upstream_commit is not None and upstream_commit != snapshot.metadata.get(
+        "upstream_commit"
+    ):
+        return False
+    check_path.touch()
+    return True
+
+
+def build_anthology_snapshot(path: Path = SNAPSHOT_PATH) -> AnthologyIndex:
+    anthology = AnthologySingleton.get()
+    records = [
+        _extract_record(paper)
+        for paper in anthology.papers()
+        if paper.abstract and str(paper.abstract).strip()
+    ]
+    repo_path = str(anthology.datadir.parent)
+    metadata = {"upstream_commit": _run_git("-C", repo_path, "rev-parse", "HEAD")}
+    index = AnthologyIndex.from_records(records, metadata=metadata)
+    index.save(path)
+    path.with_suffix(".checked").touch()
+    return AnthologyIndex.load(path)
+
+
 def _convert_to_year(date_str: str) -> int:
     try:
         return int(date_str[:4])
@@ -66,45 +181,6 @@ def _has_cyrillic(text: str) -> bool:
     return bool(re.search("[а-яА-Я]", text))
 
 
-def _parse_query(query: str, paper: Any) -> bool:
-    conditions = re.split(r"\s+(AND|OR|ANDNOT)\s+", query)
-    result = False
-    for i in range(0, len(conditions), 2):
-        condition = conditions[i]
-        field, value = (
-            condition.split(":", 1) if ":" in condition else ("ti", condition)
-        )
-        value = value.lower().replace('"', "").replace("'", "")
-        match field:
-            case "ti":
-                match_found = value in paper.title.as_text().lower()
-            case "au":
-                match_found = any(
-                    value in str(author).lower() for author in paper.authors
-                )
-            case "abs":
-                match_found = (
-                    paper.abstract and value in paper.abstract.as_text().lower()
-                )
-            case "cat":
-                match_found = any(value in cat.lower() for cat in paper.venue_ids)
-            case "id":
-                match_found = value in paper.full_id.lower()
-            case _:
-                match_found = False
-        if i == 0:
-            result = match_found
-        else:
-            operator = conditions[i - 1]
-            if operator == "AND":
-                result = result and match_found
-            elif operator == "OR":
-                result = result or match_found
-            elif operator == "ANDNOT":
-                result = result and not match_found
-    return result
-
-
 def anthology_search(
     query: str,
     offset: Optional[int] = 0,
@@ -152,7 +228,8 @@ def anthology_search(
         limit: The maximum number of items that will be returned. limit=5 by default, limit=10 is the maximum.
         start_date: Start date in %Y-%m-%d format. None by default.
         end_date: End date in %Y-%m-%d format. None by default.
-        sort_by: 3 options to sort by: relevance, lastUpdatedDate, submittedDate. relevance by default.
+        sort_by: 2 options to sort by: relevance (best matching titles and abstracts first), published.
+            relevance by default.
         sort_order: 2 sort orders: ascending, descending. descending by default.
         include_abstracts: include abstracts in the result or not. False by default.
     """
@@ -174,36 +251,33 @@ def anthology_search(
     assert not _has_cyrillic(query), "Error: use only Latin script for queries"
     assert include_abstracts is not None, "Error: include_abstracts must be bool"
 
-    singleton = AnthologySingleton.get()
-    all_papers = [
-        paper
-        for paper in singleton.papers()
-        if paper.abstract and str(paper.abstract).strip()
-    ]
-
+    index = AnthologyIndexSingleton.get()
+    start_year, end_year = None, None
     if start_date or end_date:
         start_year = _convert_to_year(start_date) if start_date else 1900
         end_year = _convert_to_year(end_date) if end_date else datetime.now().year
-        all_papers = [
-            paper for paper in all_papers if start_year <= int(paper.year) <= end_year
-        ]
-
-    filtered_papers = [paper for paper in all_papers if _parse_query(query, paper)]
-
-    if sort_by == "published":
-        filtered_papers.sort(
-            key=lambda x: int(x.year), reverse=(sort_order == "descending")
-        )
+    found_ids = index.search(query, start_year=start_year, end_year=end_year)
+    top_ids = index.rank(
+        found_ids,
+        query,
+        limit=offset + limit,
+        sort_by=sort_by,
+        sort_order=sort_order,
+    )
 
-    paged_papers = filtered_papers[offset : offset + limit]
+    paged_papers = [index.get_record(i) for i in top_ids[offset : offset + limit]]
     clean_entries = [_clean_entry(entry) for entry in paged_papers]
 
     return json.dumps(
         {
-            "total_count": len(filtered_papers),
+            "total_count": len(found_ids),
             "returned_count": len(paged_papers),
             "offset": offset,
             "results": clean_entries,
         },
         ensure_ascii=False,
     )
+
+
+if __name__ == "__main__":
+    fire.Fire(build_anthology_snapshot)
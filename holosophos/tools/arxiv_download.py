@@ -5,15 +5,19 @@
 import re
 import json
 from pathlib import Path
-from typing import Any, List, Optional, Dict
+import functools
+from typing import Any, List, Optional, Dict, TypeVar
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 
 import requests
 import bs4
 from markdownify import MarkdownConverter  # type: ignore
 
+from holosophos import http_client
+from holosophos.cache import DiskCache
 from holosophos.utils import parse_pdf_file, download_pdf
-from holosophos.files import WORKSPACE_DIR_PATH
+from holosophos.files import WORKSPACE_DIR_PATH, CACHE_DIR_PATH
 
 HTML_URL = "https://arxiv.org/html/{paper_id}"
 ABS_URL = "https://arxiv.org/abs/{paper_id}"
@@ -24,6 +28,21 @@ SECTION_STOP_WORDS = (
     "about this document",
     "appendix",
 )
+# Bump when the structure or the conversion of the downloaded papers changes
+CONVERTER_VERSION = 1
+# Papers without an explicit version can get new versions on arXiv
+UNVERSIONED_CACHE_TTL = 7 * 24 * 60 * 60
+CACHE_MAX_SIZE = 1024 * 1024 * 1024
+CACHE_MEMORY_SIZE = 32
+ARTICLE_CACHE_SIZE = 8
+
+T = TypeVar("T")
+
+_cache = DiskCache(
+    CACHE_DIR_PATH / "arxiv_download.sqlite",
+    max_size=CACHE_MAX_SIZE,
+    memory_size=CACHE_MEMORY_SIZE,
+)
 
 
 @dataclass
@@ -144,14 +163,35 @@ def _convert_soup_to_md(soup: bs4.element.Tag, url: str) -> str:
     return md_content
 
 
-def _build_by_toc(toc: TOCEntry, soup: bs4.element.Tag, url: str) -> List[str]:
+def _select_sections(sections: List[T], section_indices: List[int]) -> List[T]:
+    for index in section_indices:
+        assert (
+            0 <= index < len(sections)
+        ), f"Error: section index {index} is out of range, there are {len(sections)} sections"
+    return [sections[index] for index in section_indices]
+
+
+def _build_by_toc(
+    toc: TOCEntry,
+    soup: bs4.element.Tag,
+    url: str,
+    section_indices: Optional[List[int]] = None,
+) -> List[str]:
+    entries = [
+        toc_entry
+        for toc_entry in toc.linearize()
+        if toc_entry.level == 2 and not toc_entry.is_excluded()
+    ]
+    if section_indices is not None:
+        # Only the requested sections are converted to markdown
+        entries = _select_sections(entries, section_indices)
+
     final_sections = []
-    for toc_entry in toc.linearize():
-        if toc_entry.level == 2 and not toc_entry.is_excluded():
-            section = soup.find(id=toc_entry.html_id)
-            assert isinstance(section, bs4.element.Tag)
-            text = _convert_soup_to_md(section, url)
-            final_sections.append(text)
+    for toc_entry in entries:
+        section = soup.find(id=toc_entry.html_id)
+        assert isinstance(section, bs4.element.Tag)
+        text = _convert_soup_to_md(section, url)
+        final_sections.append(text)
     return final_sections
 
 
@@ -208,15 +248,38 @@ def _extract_citations(soup_biblist: bs4.element.Tag) -> List[Dict[str, Any]]:
     return extracted
 
 
-def _parse_html(paper_id: str) -> Dict[str, Any]:
+def _get_cache_ttl(paper_id: str) -> Optional[int]:
+    return None if re.search(r"v\d+$", paper_id) else UNVERSIONED_CACHE_TTL
+
+
+def _fetch_article_page(paper_id: str) -> str:
+    # Raw pages are kept, so that calls for other sections don't go to arXiv
+    cache_key = f"{paper_id}:html_page"
+    cached_page = _cache.get(cache_key)
+    if cached_page is not None:
+        return cached_page.decode("utf-8")
     url = HTML_URL.format(paper_id=paper_id)
-    response = requests.get(url)
+    response = http_client.get(url)
     response.raise_for_status()
     content = response.text
+    _cache.set(cache_key, content.encode("utf-8"), ttl=_get_cache_ttl(paper_id))
+    return content
+
 
+@functools.lru_cache(maxsize=ARTICLE_CACHE_SIZE)
+def _fetch_article(paper_id: str) -> bs4.element.Tag:
+    content = _fetch_article_page(paper_id)
     soup = bs4.BeautifulSoup(content, features="lxml")
     article = soup.article
     assert article and isinstance(article, bs4.element.Tag)
+    return article
+
+
+def _parse_html(
+    paper_id: str, section_indices: Optional[List[int]] = None
+) -> Dict[str, Any]:
+    url = HTML_URL.format(paper_id=paper_id)
+    article = _fetch_article(paper_id)
 
     citations = []
     biblist_tag = article.find(class_="ltx_biblist")
@@ -224,7 +287,7 @@ def _parse_html(paper_id: str) -> Dict[str, Any]:
         citations = _extract_citations(biblist_tag)
 
     toc = _generate_toc(article)
-    sections = _build_by_toc(toc, article, url)
+    sections = _build_by_toc(toc, article, url, section_indices)
     return {
         "toc": toc.to_str(),
         "sections": sections,
@@ -235,7 +298,7 @@ def _parse_html(paper_id: str) -> Dict[str, Any]:
 
 def _parse_abs(paper_id: str) -> Dict[str, str]:
     url = ABS_URL.format(paper_id=paper_id)
-    response = requests.get(url)
+    response = http_client.get(url)
     response.raise_for_status()
     content = response.text
 
@@ -251,6 +314,18 @@ def _parse_abs(paper_id: str) -> Dict[str, str]:
     return {"title": title, "abstract": abstract}
 
 
+def _get_abs(paper_id: str) -> Dict[str, str]:
+    cache_key = f"{paper_id}:abs:{CONVERTER_VERSION}"
+    cached_abs = _cache.get(cache_key)
+    if cached_abs is not None:
+        abs_meta: Dict[str, str] = json.loads(cached_abs)
+        return abs_meta
+    abs_meta = _parse_abs(paper_id)
+    ttl = _get_cache_ttl(paper_id)
+    _cache.set(cache_key, json.dumps(abs_meta).encode("utf-8"), ttl=ttl)
+    return abs_meta
+
+
 def _parse_pdf(paper_id: str) -> Dict[str, Any]:
     url = PDF_URL.format(paper_id=paper_id)
     pdf_path: Path = WORKSPACE_DIR_PATH / (paper_id + ".pdf")
@@ -268,10 +343,55 @@ def _parse_pdf(paper_id: str) -> Dict[str, Any]:
     }
 
 
+def _parse_content(
+    paper_id: str, mode: str, section_indices: Optional[List[int]] = None
+) -> Dict[str, Any]:
+    if mode == "html":
+        try:
+            return _parse_html(paper_id, section_indices)
+        except requests.exceptions.RequestException:
+            # No HTML version or retries on server errors are exhausted,
+            # switch to the PDF without waiting for the abstract page
+            pass
+    content = _parse_pdf(paper_id)
+    if section_indices is not None:
+        content["sections"] = _select_sections(content["sections"], section_indices)
+    return content
+
+
+def _download(
+    paper_id: str, mode: str, section_indices: Optional[List[int]] = None
+) -> Dict[str, Any]:
+    cache_key = f"{paper_id}:{mode}:{CONVERTER_VERSION}"
+    cached_content = _cache.get(cache_key)
+    if cached_content is not None:
+        result: Dict[str, Any] = json.loads(cached_content)
+        if section_indices is not None:
+            result["sections"] = _select_sections(result["sections"], section_indices)
+        return result
+
+    # The abstract page and the full text are independent, so fetch them concurrently
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        abs_future = executor.submit(_get_abs, paper_id)
+        content_future = executor.submit(
+            _parse_content, paper_id, mode, section_indices
+        )
+        abs_meta = abs_future.result()
+        content = content_future.result()
+
+    result = {**abs_meta, **content}
+    if section_indices is None:
+        ttl = _get_cache_ttl(paper_id)
+        _cache.set(cache_key, json.dumps(result).encode("utf-8"), ttl=ttl)
+    return result
+
+
 def arxiv_download(
     paper_id: str,
     include_citations: Optional[bool] = False,
     mode: Optional[str] = "html",
+    include_sections: Optional[bool] = True,
+    section_indices: Optional[List[int]] = None,
 ) -> str:
     """
     Downloads a paper from Arxiv and converts it to text.
@@ -287,23 +407,28 @@ def arxiv_download(
         "citations": [...]
     }
     The "toc" key contains Table of Contents, that sometimes has indexing for sections.
+    Papers are long, so prefer reading only the sections you need:
+    first call with include_sections=False to get the Table of Contents,
+    then call again with section_indices=[...] to get specific sections.
+    If "section_indices" are given, "sections" contains only these sections in the same order.
 
     Args:
         paper_id: ID of the paper on Arxiv. For instance: 2409.06820v1
         include_citations: include "citations" in the result or not. False by default.
         mode: Which version of paper to use. Options: ["html", "pdf"]. "html" by default.
+        include_sections: include "sections" in the result or not. True by default.
+        section_indices: indices of sections to return, as in the Table of Contents. All sections by default.
     """
 
-    abs_meta = _parse_abs(paper_id)
-    if mode == "html":
-        try:
-            content = _parse_html(paper_id)
-        except requests.exceptions.HTTPError:
-            content = _parse_pdf(paper_id)
-    else:
-        content = _parse_pdf(paper_id)
+    if not include_sections:
+        section_indices = []
+    content = _download(paper_id, "html" if mode == "html" else "pdf", section_indices)
 
     if not include_citations and "citations" in content:
         content.pop("citations")
+    if not include_sections:
+        content.pop("sections")
+    elif section_indices is not None:
+        content["section_indices"] = section_indices
 
-    return json.dumps({**abs_meta, **content}, ensure_ascii=False)
+    return json.dumps(content, ensure_ascii=False)
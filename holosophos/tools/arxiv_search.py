@@ -6,15 +6,24 @@ import json
 import re
 from typing import Optional, List, Dict, Any, Union
 from datetime import datetime, date
-from urllib3.util.retry import Retry
 
 import requests
 import xmltodict
 
+from holosophos import http_client
+from holosophos.cache import DiskCache
+from holosophos.files import CACHE_DIR_PATH
+
 BASE_URL = "http://export.arxiv.org"
 URL_TEMPLATE = "{base_url}/api/query?search_query={query}&start={start}&sortBy={sort_by}&sortOrder={sort_order}&max_results={limit}"
 SORT_BY_OPTIONS = ("relevance", "lastUpdatedDate", "submittedDate")
 SORT_ORDER_OPTIONS = ("ascending", "descending")
+CACHE_TTL = 24 * 60 * 60
+CACHE_MAX_SIZE = 256 * 1024 * 1024
+
+_cache = DiskCache(
+    CACHE_DIR_PATH / "arxiv_search.sqlite", ttl=CACHE_TTL, max_size=CACHE_MAX_SIZE
+)
 
 
 def _format_text_field(text: str) -> str:
@@ -123,30 +132,17 @@ def _format_entries(
 
 
 def _get_results(url: str) -> requests.Response:
-    retry_strategy = Retry(
-        total=3,
-        backoff_factor=3,
-        status_forcelist=[500, 502, 503, 504],
-        allowed_methods=["GET"],
-    )
-
-    session = requests.Session()
-    adapter = requests.adapters.HTTPAdapter(max_retries=retry_strategy)
-    session.mount("http://", adapter)
-
     try:
-        response = session.get(url, timeout=30)
+        response = http_client.get(url)
         response.raise_for_status()
         return response
     except (
         requests.exceptions.ConnectionError,
         requests.exceptions.RequestException,
     ) as e:
-        print(f"Failed after {retry_strategy.total} retries: {str(e)}")
+        print(f"Failed after {http_client.RETRY_STRATEGY.total} retries: {str(e)}")
         raise
 
-    return response
-
 
 def arxiv_search(
     query: str,
@@ -227,8 +223,11 @@ def arxiv_search(
         sort_order=sort_order,
     )
 
-    response = _get_results(url)
-    content = response.content
+    content = _cache.get(url)
+    if content is None:
+        response = _get_results(url)
+        content = response.content
+        _cache.set(url, content)
     parsed_content = xmltodict.parse(content)
 
     feed = parsed_content.get("feed", {})
@@ -1,28 +1,44 @@
 import docker  # type: ignore
+import os
+import uuid
 import atexit
 import signal
-from typing import Optional, Any
+import inspect
+import threading
+import functools
+from contextvars import ContextVar
+from typing import Callable, Optional, Any, Iterator, List, Tuple
 
-from holosophos.files import WORKSPACE_DIR_HOST_PATH
+from docker.utils.socket import frames_iter  # type: ignore
 
+from holosophos.files import WORKSPACE_DIR_HOST_PATH
+from holosophos.shell import INTERRUPT_TIMEOUT, ShellSession, kill_children_command
 
-_container = None
-_client = None
+_pool: Optional["ContainerPool"] = None
+_default_session: Optional["BashSession"] = None
+_session_lock = threading.Lock()
+# The session of the agent calling the tool, the default session is used otherwise
+_current_session: ContextVar[Optional["BashSession"]] = ContextVar(
+    "bash_session", default=None
+)
 
-BASE_IMAGE = "python:3.9-slim"
+# An image with the scientific stack can be built from other/DockerfileBash
+BASE_IMAGE = os.getenv("BASH_IMAGE", "python:3.9-slim")
+CONTAINER_NAME_PREFIX = "bash_runner"
+CONTAINER_LABEL = "holosophos.bash_runner"
 DOCKER_WORKSPACE_DIR_PATH = "/workdir"
+OUTPUT_MAX_SIZE = 100000
+# Number of idle containers with started shells waiting for sessions
+WARM_CONTAINERS = int(os.getenv("BASH_WARM_CONTAINERS", 1))
+# Kills everything in the container except its main process
+RESET_CONTAINER_COMMAND = ["bash", "-c", "kill -KILL -1; true"]
 
 
 def cleanup_container(
     signum: Optional[Any] = None, frame: Optional[Any] = None
 ) -> None:
-    global _container
-    if _container:
-        try:
-            _container.remove(force=True)
-            _container = None
-        except Exception:
-            pass
+    if _pool:
+        _pool.shutdown()
     if signum == signal.SIGINT:
         raise KeyboardInterrupt()
 
@@ -32,7 +48,247 @@ signal.signal(signal.SIGINT, cleanup_container)
 signal.signal(signal.SIGTERM, cleanup_container)
 
 
-def bash(command: str) -> str:
+class DockerShellSession(ShellSession):
+    # A bash process inside the container, driven over an attached exec socket
+    def __init__(self, container: Any, max_output_size: Optional[int] = None) -> None:
+        super().__init__(max_output_size)
+        self.container = container
+        self._socket: Any = None
+        self._frames: Optional[Iterator[Tuple[int, bytes]]] = None
+
+    def _open(self) -> None:
+        api = self.container.client.api
+        exec_id = api.exec_create(
+            self.container.id,
+            ["bash"],
+            stdin=True,
+            stdout=True,
+            stderr=True,
+            tty=False,
+            workdir=DOCKER_WORKSPACE_DIR_PATH,
+        )["Id"]
+        self._socket = api.exec_start(exec_id, socket=True)
+        # Without a tty, stdout and stderr are multiplexed into frames
+        self._frames = frames_iter(self._socket, tty=False)
+
+    def _read(self) -> bytes:
+        assert self._frames is not None
+        for _, data in self._frames:
+            if data:
+                return bytes(data)
+        return b""
+
+    def _write(self, data: bytes) -> None:
+        assert self._socket is not None
+        getattr(self._socket, "_sock", self._socket).sendall(data)
+
+    def _kill_children(self) -> None:
+        assert self.pid
+        command = kill_children_command(self.pid)
+        self.container.exec_run(
+            ["timeout", str(INTERRUPT_TIMEOUT), "bash", "-c", command]
+        )
+
+    def _close(self) -> None:
+        if self._socket is None:
+            return
+        # bash exits when its stdin is closed
+        self._socket.close()
+        self._socket = None
+        self._frames = None
+
+
+class ContainerPool:
+    # Containers with started shells, handed out to sessions and recycled after them.
+    # Names are unique, so several processes can share one docker daemon.
+    def __init__(
+        self,
+        image: str = BASE_IMAGE,
+        size: int = WARM_CONTAINERS,
+        client: Optional[Any] = None,
+    ) -> None:
+        self.image = image
+        self.size = size
+        self._client = client
+        self._idle: List[DockerShellSession] = []
+        self._containers: List[Any] = []
+        self._num_starting = 0
+        self._is_shutdown = False
+        self._lock = threading.Lock()
+        self._fill_thread: Optional[threading.Thread] = None
+
+    def _start_container(self) -> Any:
+        if not self._client:
+            self._client = docker.from_env()
+        container = self._client.containers.run(
+            self.image,
+            "tail -f /dev/null",
+            detach=True,
+            remove=True,
+            name=f"{CONTAINER_NAME_PREFIX}_{uuid.uuid4().hex[:12]}",
+            labels={CONTAINER_LABEL: str(os.getpid())},
+            tty=True,
+            stdin_open=True,
+            volumes={
+                WORKSPACE_DIR_HOST_PATH: {
+                    "bind": DOCKER_WORKSPACE_DIR_PATH,
+                    "mode": "rw",
+                }
+            },
+            working_dir=DOCKER_WORKSPACE_DIR_PATH,
+        )
+        with self._lock:
+            self._containers.append(container)
+        return container
+
+    def _remove_container(self, container: Any) -> None:
+        with self._lock:
+            if container in self._containers:
+                self._containers.remove(container)
+        try:
+            container.remove(force=True)
+        except Exception:
+            pass
+
+    def _start_shell(self, container: Optional[Any] = None) -> DockerShellSession:
+        container = container or self._start_container()
+        shell = DockerShellSession(container, max_output_size=OUTPUT_MAX_SIZE)
+        try:
+            shell.start()
+        except Exception:
+            self._remove_container(container)
+            raise
+        return shell
+
+    def fill(self) -> None:
+        while True:
+            with self._lock:
+                num_warm = len(self._idle) + self._num_starting
+                if self._is_shutdown or num_warm >= self.size:
+                    return
+                self._num_starting += 1
+            try:
+                shell = self._start_shell()
+            except Exception as e:
+                print(f"Failed to start a warm container: {e}")
+                return
+            finally:
+                with self._lock:
+                    self._num_starting -= 1
+            with self._lock:
+                is_shutdown = self._is_shutdown
+                if not is_shutdown:
+                    self._idle.append(shell)
+            if is_shutdown:
+                shell.close()
+                self._remove_container(shell.container)
+
+    def fill_in_background(self) -> None:
+        if self.size <= 0:
+            return
+        self._fill_thread = threading.Thread(target=self.fill, daemon=True)
+        self._fill_thread.start()
+
+    def acquire(self) -> DockerShellSession:
+        while True:
+            with self._lock:
+                shell = self._idle.pop(0) if self._idle else None
+            if shell is None:
+                shell = self._start_shell()
+                break
+            if shell.is_alive:
+                break
+            self._remove_container(shell.container)
+        self.fill_in_background()
+        return shell
+
+    def release(self, shell: DockerShellSession) -> None:
+        # The next session gets a fresh shell without processes of the previous one
+        shell.close()
+        with self._lock:
+            is_kept = not self._is_shutdown and len(self._idle) < self.size
+        if not is_kept:
+            self._remove_container(shell.container)
+            return
+        try:
+            shell.container.exec_run(RESET_CONTAINER_COMMAND)
+            shell = self._start_shell(shell.container)
+        except Exception as e:
+            print(f"Failed to recycle a container: {e}")
+            self._remove_container(shell.container)
+            return
+        with self._lock:
+            self._idle.append(shell)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._is_shutdown = True
+            idle, self._idle = self._idle, []
+            containers = list(self._containers)
+        for shell in idle:
+            shell.close()
+        for container in containers:
+            self._remove_container(container)
+
+
+class BashSession:
+    # A handle of one agent to its own container from the pool
+    def __init__(self, pool: Optional[ContainerPool] = None) -> None:
+        self.pool = pool or get_pool()
+        self.shell: Optional[DockerShellSession] = None
+        self._lock = threading.Lock()
+        # Warming starts with the session, so the first command gets a started shell
+        self.pool.fill_in_background()
+
+    def get_shell(self) -> DockerShellSession:
+        with self._lock:
+            if self.shell is None:
+                self.shell = self.pool.acquire()
+            return self.shell
+
+    def close(self) -> None:
+        with self._lock:
+            if self.shell is not None:
+                self.pool.release(self.shell)
+                self.shell = None
+
+
+def get_pool() -> ContainerPool:
+    global _pool
+    with _session_lock:
+        if _pool is None:
+            _pool = ContainerPool()
+        return _pool
+
+
+def get_session() -> BashSession:
+    global _default_session
+    session = _current_session.get()
+    if session is not None:
+        return session
+    pool = get_pool()
+    with _session_lock:
+        if _default_session is None:
+            _default_session = BashSession(pool)
+        return _default_session
+
+
+def bind_bash_tool(
+    function: Callable[..., str], session: BashSession
+) -> Callable[..., str]:
+    @functools.wraps(function)
+    def wrapper(*args: Any, **kwargs: Any) -> str:
+        token = _current_session.set(session)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _current_session.reset(token)
+
+    wrapper.__signature__ = inspect.signature(function)  # type: ignore
+    return wrapper
+
+
+def bash(command: str, timeout: Optional[int] = 60) -> str:
     """
     Run commands in a bash shell.
     When invoking this tool, the contents of the "command" parameter does NOT need to be XML-escaped.
@@ -40,44 +296,18 @@ def bash(command: str) -> str:
     You do have access to a mirror of common linux and python packages via apt and pip.
     State is persistent across command calls and discussions with the user.
     To inspect a particular line range of a file, e.g. lines 10-25, try 'sed -n 10,25p /path/to/the/file'.
-    Please avoid commands that may produce a very large amount of output.
+    Please avoid commands that may produce a very large amount of output, it is truncated.
     Please run long lived commands in the background, e.g. 'sleep 10 &' or start a server in the background.
+    If a command times out, it is killed, but the shell state is kept.
 
     Args:
         command: The bash command to run.
+        timeout: Timeout for the command execution. 60 seconds by default.
     """
 
-    global _container, _client
-
-    if not _client:
-        _client = docker.from_env()
-
-    if not _container:
-        try:
-            _container = _client.containers.get("bash_runner")
-        except docker.errors.NotFound:
-            _container = _client.containers.run(
-                BASE_IMAGE,
-                "tail -f /dev/null",
-                detach=True,
-                remove=True,
-                name="bash_runner",
-                tty=True,
-                stdin_open=True,
-                volumes={
-                    WORKSPACE_DIR_HOST_PATH: {
-                        "bind": DOCKER_WORKSPACE_DIR_PATH,
-                        "mode": "rw",
-                    }
-                },
-                working_dir=DOCKER_WORKSPACE_DIR_PATH,
-            )
-
-    result = _container.exec_run(
-        ["bash", "-c", command],
-        workdir=DOCKER_WORKSPACE_DIR_PATH,
-        stdout=True,
-        stderr=True,
-    )
-    output: str = result.output.decode("utf-8").strip()
-    return output
+    assert timeout
+    try:
+        output, _ = get_session().get_shell().run(command, timeout=timeout)
+    except (TimeoutError, EOFError) as e:
+        return str(e)
+    return output.strip()
@@ -0,0 +1,86 @@
+import math
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from holosophos.utils import tokenize
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Reciprocal rank fusion constant for combining lexical and embedding rankings
+RRF_K = 60
+
+Embedder = Callable[[List[str]], Sequence[Sequence[float]]]
+
+
+class DocumentIndex:
+    def __init__(self, chunks: List[str], embedder: Optional[Embedder] = None):
+        self.chunks = chunks
+        self.embedder = embedder
+        self.term_freqs = [Counter(tokenize(chunk)) for chunk in chunks]
+        self.lengths = [sum(term_freqs.values()) for term_freqs in self.term_freqs]
+        self.avg_length = max(sum(self.lengths) / max(len(chunks), 1), 1.0)
+
+        doc_freqs: Counter[str] = Counter()
+        for term_freqs in self.term_freqs:
+            doc_freqs.update(term_freqs.keys())
+        num_chunks = len(chunks)
+        self.idf: Dict[str, float] = {
+            term: math.log(1.0 + (num_chunks - df + 0.5) / (df + 0.5))
+            for term, df in doc_freqs.items()
+        }
+
+        self.embeddings: Optional[np.ndarray] = None
+        if embedder is not None and chunks:
+            self.embeddings = _normalize(np.asarray(embedder(chunks), dtype=np.float32))
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def bm25_scores(self, query: str) -> List[float]:
+        terms = set(tokenize(query))
+        scores = []
+        for term_freqs, length in zip(self.term_freqs, self.lengths):
+            score = 0.0
+            norm = 1.0 - BM25_B + BM25_B * length / self.avg_length
+            for term in terms:
+                tf = term_freqs.get(term, 0)
+                if tf:
+                    tf_score = tf * (BM25_K1 + 1.0) / (tf + BM25_K1 * norm)
+                    score += self.idf[term] * tf_score
+            scores.append(score)
+        return scores
+
+    def embedding_scores(self, query: str) -> np.ndarray:
+        assert self.embedder is not None and self.embeddings is not None
+        query_embedding = _normalize(np.asarray(self.embedder([query]), np.float32))
+        scores: np.ndarray = self.embeddings @ query_embedding[0]
+        return scores
+
+    def search(self, query: str, top_k: int) -> List[int]:
+        rankings: List[List[int]] = []
+        bm25_scores = self.bm25_scores(query)
+        lexical_ranking = sorted(
+            (i for i, score in enumerate(bm25_scores) if score > 0),
+            key=lambda i: -bm25_scores[i],
+        )
+        rankings.append(lexical_ranking)
+        if self.embeddings is not None:
+            embedding_scores = self.embedding_scores(query)
+            k = min(top_k, len(self))
+            top = np.argpartition(-embedding_scores, k - 1)[:k]
+            top = top[np.argsort(-embedding_scores[top])]
+            rankings.append([int(i) for i in top])
+
+        fused_scores: Dict[int, float] = defaultdict(float)
+        for ranking in rankings:
+            for rank, chunk_index in enumerate(ranking):
+                fused_scores[chunk_index] += 1.0 / (RRF_K + rank + 1)
+        return sorted(fused_scores, key=lambda i: -fused_scores[i])[:top_k]
+
+
+def _normalize(embeddings: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    normalized: np.ndarray = embeddings / np.maximum(norms, 1e-12)
+    return normalized
@@ -1,8 +1,15 @@
-from typing import Optional
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional, List, Dict
+from concurrent.futures import ThreadPoolExecutor
 
 from smolagents.tools import Tool  # type: ignore
 from smolagents.models import Model  # type: ignore
 
+from holosophos.cache import DiskCache, hash_key
+from holosophos.files import CACHE_DIR_PATH
+from holosophos.tools.document_index import DocumentIndex, Embedder
 
 SYSTEM_PROMPT = "You are a helpful assistant that answers questions about documents accurately and concisely."
 PROMPT = """Please answer the following questions based solely on the provided document.
@@ -24,6 +31,63 @@ Questions (repeated):
 
 Your citations and answers:"""
 
+CHUNK_PROMPT = """Please answer the following questions based solely on the provided document fragment.
+The fragment is part {chunk_number} of {chunks_count} of a bigger document.
+If there is no answer to any of the questions in the fragment, output "{no_answer}" and nothing else.
+First cite ALL relevant fragment parts, then provide an answer.
+Answer all given questions one by one.
+Make sure that you answer the actual questions, and not some other similar questions.
+
+Questions:
+{questions}
+
+Fragment:
+==== BEGIN FRAGMENT ====
+{document}
+==== END FRAGMENT ====
+
+Questions (repeated):
+{questions}
+
+Your citations and answers:"""
+
+REDUCE_PROMPT = """Below are partial answers to the questions, each based on a different fragment of the same document.
+Combine them into a final answer to all given questions one by one.
+Keep ALL relevant citations from the partial answers.
+If the partial answers contradict each other, mention it.
+If there is no answer in the partial answers, output "There is no answer in the provided document".
+
+Questions:
+{questions}
+
+Partial answers:
+{answers}
+
+Your citations and final answers:"""
+
+NO_ANSWER = "There is no answer in this fragment"
+NO_ANSWER_IN_DOCUMENT = "There is no answer in the provided document"
+
+# Sizes are in approximate tokens, estimated as whitespace-separated words
+CHUNK_SIZE = 4000
+CHUNK_OVERLAP = 200
+MAX_FULL_DOCUMENT_SIZE = 16000
+MAX_WORKERS = 4
+RETRIEVAL_CHUNK_SIZE = 400
+RETRIEVAL_CHUNK_OVERLAP = 50
+RETRIEVAL_TOP_K = 8
+INDEX_CACHE_SIZE = 16
+# Bump when prompts or the answering logic change
+PROMPT_VERSION = 1
+ANSWER_CACHE_MAX_SIZE = 64 * 1024 * 1024
+ANSWER_CACHE_MEMORY_SIZE = 128
+
+_cache = DiskCache(
+    CACHE_DIR_PATH / "document_qa.sqlite",
+    max_size=ANSWER_CACHE_MAX_SIZE,
+    memory_size=ANSWER_CACHE_MEMORY_SIZE,
+)
+
 DESCRIPTION = """
 Answer questions about a document.
 Use this tool when you need to find relevant information in a big document.
@@ -61,8 +125,40 @@ class DocumentQATool(Tool):  # type: ignore
     }
     output_type = "string"
 
-    def __init__(self, model: Model):
+    def __init__(
+        self,
+        model: Model,
+        mode: str = "auto",
+        chunk_size: int = CHUNK_SIZE,
+        chunk_overlap: int = CHUNK_OVERLAP,
+        max_workers: int = MAX_WORKERS,
+        max_full_document_size: int = MAX_FULL_DOCUMENT_SIZE,
+        retrieval_chunk_size: int = RETRIEVAL_CHUNK_SIZE,
+        retrieval_chunk_overlap: int = RETRIEVAL_CHUNK_OVERLAP,
+        top_k: int = RETRIEVAL_TOP_K,
+        embedder: Optional[Embedder] = None,
+        use_cache: bool = True,
+    ):
+        assert mode in (
+            "auto",
+            "full",
+            "chunked",
+            "retrieval",
+        ), f"Error: unknown mode {mode}"
+        assert 0 <= chunk_overlap < chunk_size, "Error: invalid chunk overlap"
         self.model = model
+        self.mode = mode
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.max_workers = max_workers
+        self.max_full_document_size = max_full_document_size
+        self.retrieval_chunk_size = retrieval_chunk_size
+        self.retrieval_chunk_overlap = retrieval_chunk_overlap
+        self.top_k = top_k
+        self.embedder = embedder
+        self._indices: OrderedDict[str, DocumentIndex] = OrderedDict()
+        self._indices_lock = threading.Lock()
+        self.use_cache = use_cache
         super().__init__()
 
     def forward(
@@ -76,12 +172,113 @@ class DocumentQATool(Tool):  # type: ignore
         assert questions and questions.strip(), "Please provide non-empty 'questions'"
         assert document and document.strip(), "Please provide non-empty 'document'"
 
-        messages = [
+        if not self.use_cache:
+            return self._answer(questions, document)
+        cache_key = self._get_cache_key(questions, document)
+        cached_answer = _cache.get(cache_key)
+        if cached_answer is not None:
+            return cached_answer.decode("utf-8")
+        answer = self._answer(questions, document)
+        _cache.set(cache_key, answer.encode("utf-8"))
+        return answer
+
+    def _get_cache_key(self, questions: str, document: str) -> str:
+        model_id = getattr(self.model, "model_id", None) or type(self.model).__name__
+        embedder = type(self.embedder).__name__ if self.embedder else ""
+        embedder = getattr(self.embedder, "__name__", embedder)
+        config = (
+            self.mode,
+            self.chunk_size,
+            self.chunk_overlap,
+            self.max_full_document_size,
+            self.retrieval_chunk_size,
+            self.retrieval_chunk_overlap,
+            self.top_k,
+            embedder,
+        )
+        return hash_key(
+            str(model_id),
+            str(PROMPT_VERSION),
+            repr(config),
+            " ".join(questions.lower().split()),
+            hash_key(document),
+        )
+
+    def _answer(self, questions: str, document: str) -> str:
+        if self.mode == "retrieval":
+            document = self._retrieve(questions, document)
+
+        use_chunks = self.mode == "chunked" or (
+            self.mode == "auto" and count_tokens(document) > self.max_full_document_size
+        )
+        chunks = [document]
+        if use_chunks:
+            chunks = split_document(document, self.chunk_size, self.chunk_overlap)
+        if len(chunks) == 1:
+            prompt = PROMPT.format(questions=questions, document=document)
+            return self._generate(prompt)
+
+        prompts = [
+            CHUNK_PROMPT.format(
+                questions=questions,
+                document=chunk,
+                chunk_number=number,
+                chunks_count=len(chunks),
+                no_answer=NO_ANSWER,
+            )
+            for number, chunk in enumerate(chunks, start=1)
+        ]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            partial_answers = list(executor.map(self._generate, prompts))
+
+        answers = [
+            f"==== ANSWER FROM FRAGMENT {number} ====\n{answer}"
+            for number, answer in enumerate(partial_answers, start=1)
+            # Answers to some of the questions are kept even if others are missing
+            if answer.strip().rstrip(".").lower() != NO_ANSWER.lower()
+        ]
+        if not answers:
+            return NO_ANSWER_IN_DOCUMENT
+        prompt = REDUCE_PROMPT.format(questions=questions, answers="\n\n".join(answers))
+        return self._generate(prompt)
+
+    def get_index(self, document: str) -> DocumentIndex:
+        # Indices are reused across calls for the same document
+        key = hash_key(
+            document,
+            str(self.retrieval_chunk_size),
+            str(self.retrieval_chunk_overlap),
+        )
+        with self._indices_lock:
+            index = self._indices.get(key)
+            if index is not None:
+                self._indices.move_to_end(key)
+                return index
+
+        chunks = split_document(
+            document, self.retrieval_chunk_size, self.retrieval_chunk_overlap
+        )
+        index = DocumentIndex(chunks, embedder=self.embedder)
+        with self._indices_lock:
+            self._indices[key] = index
+            while len(self._indices) > INDEX_CACHE_SIZE:
+                self._indices.popitem(last=False)
+        return index
+
+    def _retrieve(self, questions: str, document: str) -> str:
+        index = self.get_index(document)
+        if len(index) <= self.top_k:
+            return document
+        found = index.search(questions, self.top_k)
+        if not found:
+            return document
+        # Fragments are kept in the document order
+        return "\n\n[...]\n\n".join(index.chunks[i] for i in sorted(found))
+
+    def _generate(self, prompt: str) -> str:
+        messages: List[Dict[str, str]] = [
             {"role": "system", "content": SYSTEM_PROMPT},
-            {
-                "role": "user",
-                "content": PROMPT.format(questions=questions, document=document),
-            },
+            {"role": "user", "content": prompt},
         ]
 
         try:
@@ -92,3 +289,21 @@ class DocumentQATool(Tool):  # type: ignore
             return final_response
         except Exception as e:
             raise Exception(f"Error generating response: {str(e)}")
+
+
+def count_tokens(text: str) -> int:
+    return len(text.split())
+
+
+def split_document(document: str, chunk_size: int, chunk_overlap: int) -> List[str]:
+    # Chunks are cut at word boundaries and keep the original formatting
+    starts = [match.start() for match in re.finditer(r"\S+", document)]
+    if len(starts) <= chunk_size:
+        return [document]
+    chunks = []
+    step = chunk_size - chunk_overlap
+    for first_word in range(0, len(starts) - chunk_overlap, step):
+        last_word = first_word + chunk_size
+        end = starts[last_word] if last_word < len(starts) else len(document)
+        chunks.append(document[starts[first_word] : end].strip())
+    return chunks
@@ -1,22 +1,96 @@
 import os
+import re
 import time
+import socket
+import uuid
+import shlex
+import shutil
+import base64
+import tempfile
 import subprocess
 import atexit
 import signal
 import inspect
+import threading
 import functools
+from collections import deque
+from contextvars import ContextVar
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import List, Optional, Any, Callable
-from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Any, Callable, Set, Tuple
+from dataclasses import asdict, dataclass, field
 
+import fire  # type: ignore
 from dotenv import load_dotenv
 from vastai_sdk import VastAI  # type: ignore
 
-from holosophos.files import WORKSPACE_DIR_PATH
+from holosophos.files import WORKSPACE_DIR_PATH, CACHE_DIR_PATH
+from holosophos.instance_pool import InstancePool
+from holosophos.utils import hash_file
+from holosophos.shell import (
+    INTERRUPT_TIMEOUT,
+    START_TIMEOUT,
+    ProcessShellSession,
+    kill_children_command,
+)
 
 BASE_IMAGE = "phoenix120/holosophos_mle"
 DEFAULT_GPU_TYPE = "RTX_3090"
 GLOBAL_TIMEOUT = 43200
+# Number of offers launched concurrently, the first instance with working SSH wins
+PROVISIONING_FAN_OUT = int(os.getenv("PROVISIONING_FAN_OUT", 3))
+# Cap on the total price per hour of instances launched at the same time
+PROVISIONING_MAX_DPH = float(os.getenv("PROVISIONING_MAX_DPH", 0)) or None
+# Polling starts fast and backs off exponentially up to a small cap
+POLL_INITIAL_INTERVAL = 1.0
+POLL_MAX_INTERVAL = 8.0
+POLL_BACKOFF = 2.0
+SSH_READY_TIMEOUT = 300
+TCP_PROBE_TIMEOUT = 2.0
+SSH_KEY_PATH = Path("~/.ssh/id_rsa").expanduser()
+# One multiplexed SSH connection per host, %C is expanded by ssh itself
+SSH_CONTROL_PATH = str(Path(tempfile.gettempdir()) / "holosophos-ssh-%C")
+SSH_CONTROL_PERSIST = 600
+SSH_ERROR_CODE = 255
+REMOTE_WORKDIR = "/root"
+JOBS_DIR_NAME = ".holosophos_jobs"
+# Sessions beyond the budget wait for a free instance
+MAX_REMOTE_INSTANCES = int(os.getenv("MAX_REMOTE_INSTANCES", 1))
+# Sessions sharing one multi-GPU instance get their own workdirs and GPUs
+SESSIONS_PER_INSTANCE = int(os.getenv("SESSIONS_PER_INSTANCE", 1))
+# Number of warm instances kept for other runs after exit, 0 disables the pool
+INSTANCE_POOL_SIZE = int(os.getenv("INSTANCE_POOL_SIZE", 0))
+INSTANCE_POOL_IDLE_TTL = int(os.getenv("INSTANCE_POOL_IDLE_TTL", 1800))
+INSTANCE_POOL_PATH = CACHE_DIR_PATH / "instance_pool.json"
+# Kills leftover jobs and removes everything except hidden files from the workdir
+RESET_WORKDIR_COMMAND = (
+    "for f in {jobs_dir}/*/pid; do "
+    '[ -f "$f" ] && kill -KILL -- -$(cat "$f") 2>/dev/null; done; '
+    "rm -rf {jobs_dir}; "
+    "find {workdir} -mindepth 1 -maxdepth 1 ! -name '.*' -exec rm -rf {{}} +; true"
+)
+JOB_OUTPUT_MAX_BYTES = 20000
+# The job is detached from the shell with a subshell and gets its own process group
+START_JOB_COMMAND = (
+    "mkdir -p {job_dir} && printf %s '{encoded}' | base64 -d > {job_dir}/command.sh && "
+    "(setsid nohup bash -c 'bash {job_dir}/command.sh > {job_dir}/output.log 2>&1; "
+    "echo $? > {job_dir}/exit_code' > /dev/null 2>&1 < /dev/null & "
+    "echo $! > {job_dir}/pid)"
+)
+JOB_STATUS_COMMAND = (
+    "cd {job_dir} && if [ -f exit_code ]; then echo finished $(cat exit_code); "
+    "elif [ -f cancelled ]; then echo cancelled; "
+    "elif kill -0 $(cat pid) 2>/dev/null; then echo running; "
+    "else echo lost; fi"
+)
+JOB_OUTPUT_COMMAND = (
+    "cd {job_dir} && touch output.log && stat -c %s output.log && "
+    "tail -c +{start} output.log | head -c {max_bytes} | base64 -w 0"
+)
+CANCEL_JOB_COMMAND = (
+    "cd {job_dir} && if [ ! -f exit_code ]; then touch cancelled; "
+    "kill -TERM -- -$(cat pid) 2>/dev/null; fi; true"
+)
 
 
 @dataclass
@@ -28,22 +102,41 @@ class InstanceInfo:
     ssh_key_path: str = ""
     gpu_name: str = ""
     start_time: int = 0
+    control_path: str = ""
+    # Seconds from the launch to reaching each of the provisioning stages
+    stage_timings: Dict[str, float] = field(default_factory=dict)
+    launch_time: float = 0.0
 
 
 _sdk: Optional[VastAI] = None
-_instance_info: Optional[InstanceInfo] = None
+_sdk_lock = threading.Lock()
+# Instances that are still being provisioned, destroyed on cleanup
+_launched_instance_ids: Set[int] = set()
+_launched_instance_ids_lock = threading.Lock()
+_pool = InstancePool(INSTANCE_POOL_PATH, INSTANCE_POOL_IDLE_TTL)
+_scheduler: Optional["InstanceScheduler"] = None
+_default_session: Optional["RemoteSession"] = None
+_session_lock = threading.RLock()
+# The session of the agent calling a tool, the default session is used otherwise
+_current_session: ContextVar[Optional["RemoteSession"]] = ContextVar(
+    "remote_session", default=None
+)
 
 
 def cleanup_machine(signum: Optional[Any] = None, frame: Optional[Any] = None) -> None:
     print("Cleaning up...")
-    global _instance_info
     signal.alarm(0)
-    if _instance_info and _sdk:
-        try:
-            _sdk.destroy_instance(id=_instance_info.instance_id)
-            _instance_info = None
-        except Exception:
-            pass
+    if _scheduler:
+        _scheduler.shutdown()
+    if _sdk:
+        with _launched_instance_ids_lock:
+            instance_ids = list(_launched_instance_ids)
+            _launched_instance_ids.clear()
+        for instance_id in instance_ids:
+            try:
+                _sdk.destroy_instance(id=instance_id)
+            except Exception:
+                pass
     if signum == signal.SIGINT:
         raise KeyboardInterrupt()
 
@@ -54,12 +147,26 @@ signal.signal(signal.SIGTERM, cleanup_machine)
 signal.signal(signal.SIGALRM, cleanup_machine)
 
 
+def get_sdk() -> VastAI:
+    global _sdk
+    with _sdk_lock:
+        if not _sdk:
+            load_dotenv()
+            _sdk = VastAI(api_key=os.getenv("VAST_AI_KEY"))
+        return _sdk
+
+
 def wait_for_instance(
-    vast_sdk: VastAI, instance_id: str, max_wait_time: int = 300
+    vast_sdk: VastAI,
+    instance_id: int,
+    max_wait_time: int = 300,
+    stop_event: Optional[threading.Event] = None,
 ) -> bool:
     print(f"Waiting for instance {instance_id} to be ready...")
+    stop_event = stop_event or threading.Event()
     start_wait = int(time.time())
     instance_ready = False
+    intervals = poll_intervals()
     while time.time() - start_wait < max_wait_time:
         instance_details = vast_sdk.show_instance(id=instance_id)
         if (
@@ -70,15 +177,38 @@ def wait_for_instance(
             print(f"Instance {instance_id} is running and ready.")
             break
         print(f"Instance {instance_id} not ready yet. Waiting...")
-        time.sleep(15)
+        if stop_event.wait(next(intervals)):
+            break
     return instance_ready
 
 
-def get_offers(vast_sdk: VastAI, gpu_name: str) -> List[int]:
+def poll_intervals() -> Iterator[float]:
+    interval = POLL_INITIAL_INTERVAL
+    while True:
+        yield interval
+        interval = min(interval * POLL_BACKOFF, POLL_MAX_INTERVAL)
+
+
+def _reach_stage(timings: Dict[str, float], stage: str, launch_time: float) -> None:
+    timings[stage] = round(time.monotonic() - launch_time, 1)
+    print(f"Stage '{stage}' reached in {timings[stage]}s after launch")
+
+
+def is_port_open(host: str, port: int, timeout: float = TCP_PROBE_TIMEOUT) -> bool:
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+def get_offers(
+    vast_sdk: VastAI, gpu_name: str, num_gpus: int = 1
+) -> List[Dict[str, Any]]:
     params = [
         f"gpu_name={gpu_name}",
         "cuda_vers>=12.1",
-        "num_gpus=1",
+        f"num_gpus={num_gpus}",
         "reliability > 0.99",
         "inet_up > 400",
         "inet_down > 400",
@@ -88,14 +218,12 @@ def get_offers(vast_sdk: VastAI, gpu_name: str) -> List[int]:
     ]
     query = "  ".join(params)
     order = "score-"
-    offers = vast_sdk.search_offers(query=query, order=order)
+    offers: List[Dict[str, Any]] = vast_sdk.search_offers(query=query, order=order)
     assert offers
-    return [int(o["id"]) for o in offers]
+    return offers
 
 
-def run_command(
-    instance: InstanceInfo, command: str, timeout: int = 60
-) -> subprocess.CompletedProcess[str]:
+def _ssh_command(instance: InstanceInfo) -> List[str]:
     cmd = [
         "ssh",
         "-i",
@@ -112,11 +240,45 @@ def run_command(
         "ServerAliveCountMax=3",
         "-o",
         "TCPKeepAlive=yes",
-        f"{instance.username}@{instance.ip}",
-        command,
     ]
+    if instance.control_path:
+        cmd += [
+            "-o",
+            "ControlMaster=auto",
+            "-o",
+            f"ControlPath={instance.control_path}",
+            "-o",
+            f"ControlPersist={SSH_CONTROL_PERSIST}",
+        ]
+    return cmd
+
+
+def close_connection(instance: InstanceInfo) -> None:
+    if not instance.control_path:
+        return
+    cmd = _ssh_command(instance) + ["-O", "exit", f"{instance.username}@{instance.ip}"]
+    subprocess.run(cmd, capture_output=True, text=True, timeout=10)
+
+
+def is_connection_alive(instance: InstanceInfo) -> bool:
+    cmd = _ssh_command(instance) + ["-O", "check", f"{instance.username}@{instance.ip}"]
+    result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
+    return result.returncode == 0
+
+
+def run_command(
+    instance: InstanceInfo, command: str, timeout: int = 60
+) -> subprocess.CompletedProcess[str]:
+    cmd = _ssh_command(instance) + [f"{instance.username}@{instance.ip}", command]
     try:
         result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        is_retryable = result.returncode == SSH_ERROR_CODE and instance.control_path
+        # The command itself may exit with 255, it is rerun only if the connection broke
+        if is_retryable and not is_connection_alive(instance):
+            close_connection(instance)
+            result = subprocess.run(
+                cmd, capture_output=True, text=True, timeout=timeout
+            )
         if result.returncode != 0:
             raise Exception(
                 f"Error running command: {command}; "
@@ -131,6 +293,39 @@ def run_command(
     return result
 
 
+def reset_workdir_command(workdir: str) -> str:
+    jobs_dir = f"{workdir}/{JOBS_DIR_NAME}"
+    return RESET_WORKDIR_COMMAND.format(workdir=workdir, jobs_dir=jobs_dir)
+
+
+class RemoteShellSession(ProcessShellSession):
+    def __init__(self, instance: InstanceInfo, init_command: str = "") -> None:
+        host = f"{instance.username}@{instance.ip}"
+        super().__init__(_ssh_command(instance) + ["-T", host, "bash"])
+        self.instance = instance
+        self.init_command = init_command
+
+    def start(self) -> None:
+        super().start()
+        if not self.init_command:
+            return
+        # Restarted shells get the same working directory and environment
+        try:
+            marker = self._send(self.init_command)
+            output, exit_code = self._wait(marker, START_TIMEOUT)
+        except Exception:
+            self.close()
+            raise
+        if exit_code != 0:
+            self.close()
+            raise Exception(f"Error initializing the shell: {output}")
+
+    def _kill_children(self) -> None:
+        assert self.pid
+        command = kill_children_command(self.pid)
+        run_command(self.instance, command, timeout=INTERRUPT_TIMEOUT)
+
+
 def recieve_rsync(
     info: InstanceInfo, remote_path: str, local_path: str
 ) -> subprocess.CompletedProcess[str]:
@@ -138,7 +333,7 @@ def recieve_rsync(
         "rsync",
         "-avz",
         "-e",
-        f"ssh -i {info.ssh_key_path} -p {info.port} -o StrictHostKeyChecking=no",
+        shlex.join(_ssh_command(info)),
         f"{info.username}@{info.ip}:{remote_path}",
         local_path,
     ]
@@ -157,7 +352,7 @@ def send_rsync(
         "rsync",
         "-avz",
         "-e",
-        f"ssh -i {info.ssh_key_path} -p {info.port} -o StrictHostKeyChecking=no",
+        shlex.join(_ssh_command(info)),
         local_path,
         f"{info.username}@{info.ip}:{remote_path}",
     ]
@@ -169,112 +364,528 @@ def send_rsync(
     return result
 
 
-def launch_instance(vast_sdk: VastAI, gpu_name: str) -> Optional[InstanceInfo]:
-    print(f"Selecting instance with {gpu_name}...")
-    offer_ids = get_offers(vast_sdk, gpu_name)
+def send_files(
+    info: InstanceInfo, local_dir: str, names: List[str], remote_dir: str
+) -> subprocess.CompletedProcess[str]:
+    # One rsync process for all files, the list is passed through stdin
+    rsync_cmd = [
+        "rsync",
+        "-az",
+        "--files-from=-",
+        "-e",
+        shlex.join(_ssh_command(info)),
+        f"{local_dir}/",
+        f"{info.username}@{info.ip}:{remote_dir}",
+    ]
+
+    result = subprocess.run(
+        rsync_cmd, input="\n".join(names), capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        error_output = (
+            f"Error syncing files: {names} to {remote_dir}. Error: {result.stderr}"
+        )
+        raise Exception(error_output)
+    return result
 
-    instance_id = None
-    for offer_id in offer_ids:
-        print(f"Launching offer {offer_id}...")
-        instance = vast_sdk.create_instance(id=offer_id, image=BASE_IMAGE, disk=50.0)
-        if not instance["success"]:
-            continue
-        instance_id = instance["new_contract"]
-        assert instance_id
-        global _instance_info
-        _instance_info = InstanceInfo(instance_id=instance_id)
-        print(f"Instance launched successfully. ID: {instance_id}")
-        is_ready = wait_for_instance(vast_sdk, instance_id)
-        if not is_ready:
-            print(f"Destroying instance {instance_id}...")
-            vast_sdk.destroy_instance(id=instance_id)
-            continue
 
-        print("Attaching SSH key...")
-        ssh_key_path = Path("~/.ssh/id_rsa").expanduser()
-        if not ssh_key_path.exists():
-            print(f"Generating SSH key at {ssh_key_path}...")
-            os.makedirs(ssh_key_path.parent, exist_ok=True)
-            subprocess.run(
-                [
-                    "ssh-keygen",
-                    "-t",
-                    "rsa",
-                    "-b",
-                    "4096",
-                    "-f",
-                    str(ssh_key_path),
-                    "-N",
-                    "",
-                ]
-            )
+def send_file(info: InstanceInfo, local_path: Path, remote_path: str) -> None:
+    # Goes through the multiplexed connection, without a separate rsync process
+    quoted_path = shlex.quote(remote_path)
+    command = f"mkdir -p $(dirname {quoted_path}) && cat > {quoted_path}"
+    cmd = _ssh_command(info) + [f"{info.username}@{info.ip}", command]
+    result = subprocess.run(cmd, input=local_path.read_bytes(), capture_output=True)
+    if result.returncode != 0:
+        error_output = f"Error sending file: {local_path} to {remote_path}. Error: {result.stderr.decode()}"
+        raise Exception(error_output)
 
-        public_key = Path(f"{ssh_key_path}.pub").read_text().strip()
-        vast_sdk.attach_ssh(instance_id=instance_id, ssh_key=public_key)
-        instance_details = vast_sdk.show_instance(id=instance_id)
 
-        info = InstanceInfo(
-            instance_id=instance_details.get("id"),
-            ip=instance_details.get("ssh_host"),
-            port=instance_details.get("ssh_port"),
-            username="root",
-            ssh_key_path=str(ssh_key_path),
-            gpu_name=instance_details.get("gpu_name"),
-            start_time=int(time.time()),
+def _ensure_ssh_key() -> str:
+    if not SSH_KEY_PATH.exists():
+        print(f"Generating SSH key at {SSH_KEY_PATH}...")
+        os.makedirs(SSH_KEY_PATH.parent, exist_ok=True)
+        subprocess.run(
+            [
+                "ssh-keygen",
+                "-t",
+                "rsa",
+                "-b",
+                "4096",
+                "-f",
+                str(SSH_KEY_PATH),
+                "-N",
+                "",
+            ]
         )
+    return Path(f"{SSH_KEY_PATH}.pub").read_text().strip()
+
+
+def _destroy_instance(vast_sdk: VastAI, instance_id: int) -> None:
+    print(f"Destroying instance {instance_id}...")
+    try:
+        vast_sdk.destroy_instance(id=instance_id)
+    except Exception as e:
+        print(f"Failed to destroy instance {instance_id}: {e}")
+    with _launched_instance_ids_lock:
+        _launched_instance_ids.discard(instance_id)
 
-        print(info)
-        print(f"Checking SSH connection to {info.ip}:{info.port}...")
-        max_attempts = 10
-        is_okay = False
-        for attempt in range(max_attempts):
+
+def _check_ssh(info: InstanceInfo, stop_event: threading.Event) -> bool:
+    # ssh is spawned only when the port accepts TCP connections
+    print(f"Checking SSH connection to {info.ip}:{info.port}...")
+    start_wait = time.monotonic()
+    intervals = poll_intervals()
+    while time.monotonic() - start_wait < SSH_READY_TIMEOUT:
+        if is_port_open(info.ip, info.port):
             try:
                 result = run_command(info, "echo 'SSH connection successful'")
+                if "SSH connection successful" in result.stdout:
+                    print("SSH connection established successfully!")
+                    return True
             except Exception as e:
-                print(f"Waiting for SSH... {e}\n(Attempt {attempt+1}/{max_attempts})")
-                time.sleep(30)
-                continue
-            if "SSH connection successful" in result.stdout:
-                print("SSH connection established successfully!")
-                is_okay = True
+                print(f"Waiting for SSH... {e}")
+        if stop_event.wait(next(intervals)):
+            break
+    return False
+
+
+def _provision_offer(
+    vast_sdk: VastAI, offer_id: int, public_key: str, stop_event: threading.Event
+) -> Optional[InstanceInfo]:
+    print(f"Launching offer {offer_id}...")
+    launch_time = time.monotonic()
+    timings: Dict[str, float] = {}
+    instance = vast_sdk.create_instance(id=offer_id, image=BASE_IMAGE, disk=50.0)
+    if not instance["success"]:
+        return None
+    instance_id = instance["new_contract"]
+    assert instance_id
+    with _launched_instance_ids_lock:
+        _launched_instance_ids.add(instance_id)
+    print(f"Instance launched successfully. ID: {instance_id}")
+    _reach_stage(timings, "provisioning", launch_time)
+    # The instance is billed from now on, so it is destroyed on any failure
+    try:
+        return _prepare_instance(
+            vast_sdk, instance_id, public_key, stop_event, timings, launch_time
+        )
+    except Exception:
+        _destroy_instance(vast_sdk, instance_id)
+        raise
+
+
+def _prepare_instance(
+    vast_sdk: VastAI,
+    instance_id: int,
+    public_key: str,
+    stop_event: threading.Event,
+    timings: Dict[str, float],
+    launch_time: float,
+) -> Optional[InstanceInfo]:
+    is_ready = wait_for_instance(vast_sdk, instance_id, stop_event=stop_event)
+    if not is_ready or stop_event.is_set():
+        _destroy_instance(vast_sdk, instance_id)
+        return None
+    _reach_stage(timings, "running", launch_time)
+
+    print("Attaching SSH key...")
+    vast_sdk.attach_ssh(instance_id=instance_id, ssh_key=public_key)
+    instance_details = vast_sdk.show_instance(id=instance_id)
+
+    info = InstanceInfo(
+        instance_id=instance_details.get("id"),
+        ip=instance_details.get("ssh_host"),
+        port=instance_details.get("ssh_port"),
+        username="root",
+        ssh_key_path=str(SSH_KEY_PATH),
+        gpu_name=instance_details.get("gpu_name"),
+        start_time=int(time.time()),
+        control_path=SSH_CONTROL_PATH,
+        stage_timings=timings,
+        launch_time=launch_time,
+    )
+    print(info)
+
+    if not _check_ssh(info, stop_event) or stop_event.is_set():
+        close_connection(info)
+        _destroy_instance(vast_sdk, instance_id)
+        return None
+    _reach_stage(timings, "ssh_ready", launch_time)
+    return info
+
+
+def _get_candidate(
+    future: "Future[Optional[InstanceInfo]]",
+) -> Optional[InstanceInfo]:
+    try:
+        return future.result()
+    except Exception as e:
+        print(f"Failed to provision an instance: {e}")
+        return None
+
+
+def launch_instance(
+    vast_sdk: VastAI,
+    gpu_name: str,
+    fan_out: int = PROVISIONING_FAN_OUT,
+    max_dph: Optional[float] = PROVISIONING_MAX_DPH,
+    num_gpus: int = 1,
+) -> Optional[InstanceInfo]:
+    print(f"Selecting instance with {num_gpus}x {gpu_name}...")
+    offers = deque(get_offers(vast_sdk, gpu_name, num_gpus))
+    public_key = _ensure_ssh_key()
+
+    stop_event = threading.Event()
+    pending: Dict["Future[Optional[InstanceInfo]]", float] = {}
+    info: Optional[InstanceInfo] = None
+    with ThreadPoolExecutor(max_workers=fan_out) as executor:
+        while True:
+            while offers and len(pending) < fan_out:
+                dph = float(offers[0].get("dph_total", 0.0))
+                if max_dph is not None and sum(pending.values()) + dph > max_dph:
+                    if pending:
+                        break
+                    print(f"Skipping offer {offers[0]['id']}, too expensive: {dph}")
+                    offers.popleft()
+                    continue
+                offer_id = int(offers.popleft()["id"])
+                future = executor.submit(
+                    _provision_offer, vast_sdk, offer_id, public_key, stop_event
+                )
+                pending[future] = dph
+            if not pending:
                 break
-            print(f"Waiting for SSH... (Attempt {attempt+1}/{max_attempts})")
-            time.sleep(30)
 
-        if not is_okay:
-            print(f"Destroying instance {instance_id}...")
-            vast_sdk.destroy_instance(id=instance_id)
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.pop(future)
+                candidate = _get_candidate(future)
+                if candidate is None:
+                    continue
+                if info is None:
+                    info = candidate
+                    stop_event.set()
+                    continue
+                close_connection(candidate)
+                _destroy_instance(vast_sdk, candidate.instance_id)
+            if info is not None:
+                break
+
+    # Losers that became ready right before the stop signal
+    for future in pending:
+        candidate = _get_candidate(future)
+        if candidate is not None:
+            close_connection(candidate)
+            _destroy_instance(vast_sdk, candidate.instance_id)
+
+    if info is not None:
+        with _launched_instance_ids_lock:
+            _launched_instance_ids.discard(info.instance_id)
+    return info
+
+
+def release_instance(vast_sdk: VastAI, info: InstanceInfo) -> None:
+    # The instance is kept warm for other runs if the pool has space for it
+    if INSTANCE_POOL_SIZE > 0:
+        if _pool.count_free() < INSTANCE_POOL_SIZE and _pool.release(info.instance_id):
+            print(f"Released instance {info.instance_id} to the pool")
+            return
+        _pool.remove(info.instance_id)
+    vast_sdk.destroy_instance(id=info.instance_id)
+
+
+def lease_instance(vast_sdk: VastAI) -> Optional[InstanceInfo]:
+    while True:
+        leased = _pool.lease()
+        if leased is None:
+            return None
+        info = InstanceInfo(**leased)
+        info.stage_timings = {}
+        info.launch_time = time.monotonic()
+        try:
+            run_command(info, reset_workdir_command(REMOTE_WORKDIR))
+        except Exception as e:
+            print(f"Warm instance {info.instance_id} is not available: {e}")
+            _pool.remove(info.instance_id)
+            _destroy_instance(vast_sdk, info.instance_id)
             continue
+        print(f"Leased warm instance {info.instance_id} from the pool")
+        return info
 
-        break
 
+def reap_idle_instances(vast_sdk: Optional[VastAI] = None) -> None:
+    vast_sdk = vast_sdk or get_sdk()
+    for info in _pool.reap():
+        _destroy_instance(vast_sdk, info["instance_id"])
+
+
+def provision_instance(
+    gpu_name: str = DEFAULT_GPU_TYPE, num_gpus: int = 1
+) -> Optional[InstanceInfo]:
+    vast_sdk = get_sdk()
+    # Warm instances in the pool have a single GPU
+    use_pool = INSTANCE_POOL_SIZE > 0 and num_gpus == 1
+    info = None
+    if use_pool:
+        reap_idle_instances(vast_sdk)
+        info = lease_instance(vast_sdk)
+    if info is None:
+        info = launch_instance(vast_sdk, gpu_name, num_gpus=num_gpus)
+        if info is not None and use_pool:
+            _pool.add(info.instance_id, asdict(info))
     return info
 
 
-def send_scripts() -> None:
-    assert _instance_info
-    for name in os.listdir(WORKSPACE_DIR_PATH):
-        if name.endswith(".py"):
-            send_rsync(_instance_info, f"{WORKSPACE_DIR_PATH}/{name}", "/root")
+class RemoteSession:
+    # A handle of one agent to a remote instance with its own workdir and shell
+    def __init__(self, scheduler: Optional["InstanceScheduler"] = None) -> None:
+        self.session_id = uuid.uuid4().hex[:12]
+        self.scheduler = scheduler or get_scheduler()
+        self.instance: Optional[InstanceInfo] = None
+        self.slot = 0
+        self.workdir = REMOTE_WORKDIR
+        self.shell: Optional[RemoteShellSession] = None
+        # Content hashes of editor mirror files known to be equal to remote files.
+        # Any remote command can change files, so every command bumps the generation.
+        self.synced_files: Dict[str, Tuple[str, int]] = {}
+        # Content hashes of workspace scripts at their last upload
+        self.sent_scripts: Dict[str, str] = {}
+        # Jobs not yet seen finished, they can change files at any time
+        self.active_jobs: Set[str] = set()
+        self.generation = 0
+        self._lock = threading.RLock()
+
+    @property
+    def jobs_dir(self) -> str:
+        return f"{self.workdir}/{JOBS_DIR_NAME}"
+
+    @property
+    def mirror_dir(self) -> Path:
+        # Files opened with the editor are mirrored locally apart from other sessions
+        return WORKSPACE_DIR_PATH / ".sessions" / self.session_id
+
+    def remote_path(self, path: str) -> str:
+        return f"{self.workdir}/{path}"
+
+    def get_instance(self) -> InstanceInfo:
+        with self._lock:
+            signal.alarm(GLOBAL_TIMEOUT)
+            if self.instance is None:
+                self.instance, self.slot = self.scheduler.acquire(self)
+                if self.scheduler.sessions_per_instance > 1:
+                    self.workdir = f"{REMOTE_WORKDIR}/sessions/{self.session_id}"
+                    run_command(self.instance, f"mkdir -p {self.workdir}")
+
+            self.send_scripts()
+            if "scripts_synced" not in self.instance.stage_timings:
+                _reach_stage(
+                    self.instance.stage_timings,
+                    "scripts_synced",
+                    self.instance.launch_time,
+                )
+            return self.instance
+
+    def get_shell(self) -> RemoteShellSession:
+        with self._lock:
+            assert self.instance
+            if self.shell is None:
+                init_command = f"mkdir -p {self.workdir} && cd {self.workdir}"
+                if self.scheduler.sessions_per_instance > 1:
+                    init_command += f" && export CUDA_VISIBLE_DEVICES={self.slot}"
+                self.shell = RemoteShellSession(self.instance, init_command)
+            return self.shell
+
+    def invalidate_synced_files(self) -> None:
+        self.generation += 1
+
+    def is_synced(self, path: str, local_path: Path) -> bool:
+        record = self.synced_files.get(path)
+        if record is None or self.active_jobs or not local_path.is_file():
+            return False
+        file_hash, generation = record
+        return generation == self.generation and hash_file(local_path) == file_hash
+
+    def mark_synced(self, path: str, local_path: Path) -> None:
+        if local_path.is_file():
+            self.synced_files[path] = (hash_file(local_path), self.generation)
+        else:
+            self.synced_files.pop(path, None)
+
+    def send_scripts(self) -> None:
+        assert self.instance
+        changed: Dict[str, str] = {}
+        for name in sorted(os.listdir(WORKSPACE_DIR_PATH)):
+            if not name.endswith(".py"):
+                continue
+            # Scripts are sent only when they changed locally since the last upload,
+            # so remote edits made with the editor are not overwritten
+            file_hash = hash_file(WORKSPACE_DIR_PATH / name)
+            if self.sent_scripts.get(name) != file_hash:
+                changed[name] = file_hash
+        if not changed:
+            return
+        send_files(self.instance, str(WORKSPACE_DIR_PATH), list(changed), self.workdir)
+        self.sent_scripts.update(changed)
+
+    def close(self) -> None:
+        with self._lock:
+            if self.shell:
+                self.shell.close()
+                self.shell = None
+            self.synced_files.clear()
+            self.sent_scripts.clear()
+            self.active_jobs.clear()
+            shutil.rmtree(self.mirror_dir, ignore_errors=True)
+            if self.instance is not None:
+                self.scheduler.release(self)
+                self.instance = None
+                self.workdir = REMOTE_WORKDIR
+
+
+class InstanceScheduler:
+    # Maps sessions to instances. A session waits when all instances are busy
+    # and no more instances can be launched within the budget.
+    def __init__(
+        self,
+        max_instances: int = MAX_REMOTE_INSTANCES,
+        sessions_per_instance: int = SESSIONS_PER_INSTANCE,
+        gpu_name: str = DEFAULT_GPU_TYPE,
+    ) -> None:
+        assert max_instances > 0, "Error: max_instances should be positive"
+        assert (
+            sessions_per_instance > 0
+        ), "Error: sessions_per_instance should be positive"
+        self.max_instances = max_instances
+        self.sessions_per_instance = sessions_per_instance
+        self.gpu_name = gpu_name
+        self.instances: Dict[int, InstanceInfo] = {}
+        # GPU slots of every instance taken by sessions
+        self.sessions: Dict[int, Dict[int, RemoteSession]] = {}
+        self._num_provisioning = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, session: RemoteSession) -> Tuple[InstanceInfo, int]:
+        with self._condition:
+            while True:
+                for instance_id, slots in self.sessions.items():
+                    if len(slots) < self.sessions_per_instance:
+                        free_slots = set(range(self.sessions_per_instance)) - set(slots)
+                        slot = min(free_slots)
+                        slots[slot] = session
+                        return self.instances[instance_id], slot
+                num_instances = len(self.instances) + self._num_provisioning
+                if num_instances < self.max_instances:
+                    self._num_provisioning += 1
+                    break
+                print(f"Session {session.session_id} is waiting for an instance...")
+                self._condition.wait()
+
+        info = None
+        try:
+            info = provision_instance(self.gpu_name, self.sessions_per_instance)
+        finally:
+            with self._condition:
+                self._num_provisioning -= 1
+                if info is not None:
+                    self.instances[info.instance_id] = info
+                    self.sessions[info.instance_id] = {0: session}
+                self._condition.notify_all()
+        assert info, "Failed to connect to a remote instance! Try again"
+        return info, 0
+
+    def release(self, session: RemoteSession) -> None:
+        info = session.instance
+        assert info
+        # The next session gets a clean workdir without leftover jobs
+        command = reset_workdir_command(session.workdir)
+        if session.workdir != REMOTE_WORKDIR:
+            command += f"; rm -rf {session.workdir}"
+        is_broken = False
+        try:
+            run_command(info, command)
+        except Exception as e:
+            print(f"Failed to reset instance {info.instance_id}: {e}")
+            is_broken = True
+
+        with self._condition:
+            slots = self.sessions.get(info.instance_id, {})
+            if slots.get(session.slot) is session:
+                slots.pop(session.slot)
+            is_dropped = is_broken and not slots and info.instance_id in self.instances
+            if is_dropped:
+                self.instances.pop(info.instance_id)
+                self.sessions.pop(info.instance_id)
+            self._condition.notify_all()
 
+        if is_dropped:
+            close_connection(info)
+            _pool.remove(info.instance_id)
+            _destroy_instance(get_sdk(), info.instance_id)
+
+    def shutdown(self) -> None:
+        with self._condition:
+            instances = list(self.instances.values())
+            sessions = [s for slots in self.sessions.values() for s in slots.values()]
+            self.instances.clear()
+            self.sessions.clear()
+            self._condition.notify_all()
+        for session in sessions:
+            if session.shell:
+                session.shell.close()
+        for info in instances:
+            try:
+                close_connection(info)
+                release_instance(get_sdk(), info)
+            except Exception:
+                pass
 
-def init_all() -> None:
-    global _sdk, _instance_info
 
-    load_dotenv()
+def get_scheduler() -> InstanceScheduler:
+    global _scheduler
+    with _session_lock:
+        if _scheduler is None:
+            _scheduler = InstanceScheduler()
+        return _scheduler
 
-    if not _sdk:
-        _sdk = VastAI(api_key=os.getenv("VAST_AI_KEY"))
-    assert _sdk
 
-    signal.alarm(GLOBAL_TIMEOUT)
-    if not _instance_info:
-        _instance_info = launch_instance(_sdk, DEFAULT_GPU_TYPE)
+def configure_scheduler(
+    max_instances: int = MAX_REMOTE_INSTANCES,
+    sessions_per_instance: int = SESSIONS_PER_INSTANCE,
+    gpu_name: str = DEFAULT_GPU_TYPE,
+) -> InstanceScheduler:
+    global _scheduler
+    with _session_lock:
+        assert (
+            _scheduler is None or not _scheduler.instances
+        ), "Error: the scheduler can't be configured after launching instances"
+        _scheduler = InstanceScheduler(max_instances, sessions_per_instance, gpu_name)
+        return _scheduler
 
-    if _instance_info:
-        send_scripts()
 
-    assert _instance_info, "Failed to connect to a remote instance! Try again"
+def get_session() -> RemoteSession:
+    global _default_session
+    session = _current_session.get()
+    if session is not None:
+        return session
+    with _session_lock:
+        if _default_session is None:
+            _default_session = RemoteSession()
+        return _default_session
+
+
+def bind_remote_tool(
+    function: Callable[..., str], session: RemoteSession
+) -> Callable[..., str]:
+    @functools.wraps(function)
+    def wrapper(*args: Any, **kwargs: Any) -> str:
+        token = _current_session.set(session)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _current_session.reset(token)
+
+    wrapper.__signature__ = inspect.signature(function)  # type: ignore
+    return wrapper
 
 
 def remote_bash(command: str, timeout: Optional[int] = 60) -> str:
@@ -287,6 +898,7 @@ def remote_bash(command: str, timeout: Optional[int] = 60) -> str:
     To inspect a particular line range of a file, e.g. lines 10-25, try 'sed -n 10,25p /path/to/the/file'.
     Please avoid commands that may produce a very large amount of output.
     Do not run commands in the background.
+    If a command times out, it is killed, but the shell state is kept.
     You can use python3.
 
     Args:
@@ -294,36 +906,168 @@ def remote_bash(command: str, timeout: Optional[int] = 60) -> str:
         timeout: Timeout for the command execution. 60 seconds by default. Set a higher value for heavy jobs.
     """
 
-    init_all()
-    assert _instance_info
+    session = get_session()
+    instance = session.get_instance()
     assert timeout
-    result = run_command(_instance_info, command, timeout=timeout)
-    if result.stdout:
-        return result.stdout
-    return result.stderr
+    session.invalidate_synced_files()
+    shell = session.get_shell()
+    try:
+        output, exit_code = shell.run(command, timeout=timeout)
+    except (TimeoutError, EOFError) as e:
+        raise Exception(f"{e}; Host: {instance.username}@{instance.ip}:{instance.port}")
+    if exit_code != 0:
+        raise Exception(
+            f"Error running command: {command}; "
+            f"Exit code: {exit_code}; "
+            f"Output: {output}"
+        )
+    return output
+
+
+def _get_job_dir(session: RemoteSession, job_id: str) -> str:
+    assert re.fullmatch(r"[0-9a-f]+", job_id), f"Error: invalid job id {job_id}"
+    return f"{session.jobs_dir}/{job_id}"
+
+
+def _get_job_status(session: RemoteSession, job_id: str) -> str:
+    assert session.instance
+    command = JOB_STATUS_COMMAND.format(job_dir=_get_job_dir(session, job_id))
+    status = run_command(session.instance, command).stdout.strip()
+    if status != "running" and job_id in session.active_jobs:
+        # Files written by the job before it stopped are pulled again
+        session.active_jobs.discard(job_id)
+        session.invalidate_synced_files()
+    if status.startswith("finished"):
+        return f"finished with exit code {status.split()[-1]}"
+    return status
+
+
+def remote_start_job(command: str) -> str:
+    """
+    Start a long-running command in the background on a remote machine with GPU cards.
+    Use it for training runs and other heavy jobs instead of remote_bash with a big timeout.
+    The job inherits the working directory and exported variables of the remote_bash shell.
+    Poll the job with remote_job_output and remote_job_status, stop it with remote_cancel_job.
+    You can run other commands with remote_bash while the job is running.
+
+    Args:
+        command: The bash command to run.
+
+    Returns:
+        The job id.
+    """
+
+    session = get_session()
+    session.get_instance()
+    assert command and command.strip(), "Error: empty command"
+    session.invalidate_synced_files()
+    job_id = uuid.uuid4().hex[:12]
+    encoded = base64.b64encode(command.encode("utf-8")).decode("ascii")
+    start_command = START_JOB_COMMAND.format(
+        job_dir=_get_job_dir(session, job_id), encoded=encoded
+    )
+    output, exit_code = session.get_shell().run(start_command)
+    assert exit_code == 0, f"Error: failed to start a job: {output}"
+    session.active_jobs.add(job_id)
+    return job_id
+
+
+def remote_job_output(
+    job_id: str, offset: Optional[int] = 0, max_bytes: Optional[int] = None
+) -> str:
+    """
+    Get the output of a background job started with remote_start_job.
+    The output is returned starting from a byte offset, so you can poll only new output.
+    The first line of the result contains the job status and the offset to use in the next call.
+
+    Args:
+        job_id: The job id returned by remote_start_job.
+        offset: Byte offset to start from. 0 by default.
+        max_bytes: Maximum number of bytes to return. 20000 by default.
+    """
+
+    session = get_session()
+    instance = session.get_instance()
+    session.invalidate_synced_files()
+    offset = offset or 0
+    max_bytes = max_bytes or JOB_OUTPUT_MAX_BYTES
+    assert offset >= 0, "Error: offset should be non-negative"
+    command = JOB_OUTPUT_COMMAND.format(
+        job_dir=_get_job_dir(session, job_id), start=offset + 1, max_bytes=max_bytes
+    )
+    output = run_command(instance, command).stdout
+    size_line, _, encoded_chunk = output.partition("\n")
+    size = int(size_line)
+    chunk = base64.b64decode(encoded_chunk)
+    next_offset = offset + len(chunk)
+    status = _get_job_status(session, job_id)
+    header = (
+        f"Job {job_id} is {status}; "
+        f"output bytes {offset}-{next_offset} of {size}; next offset: {next_offset}"
+    )
+    return f"{header}\n{chunk.decode('utf-8', errors='replace')}"
+
+
+def remote_job_status(job_id: str) -> str:
+    """
+    Get the status of a background job started with remote_start_job.
+    The status is one of: running, finished with exit code N, cancelled, lost.
+
+    Args:
+        job_id: The job id returned by remote_start_job.
+    """
+
+    session = get_session()
+    session.get_instance()
+    session.invalidate_synced_files()
+    return _get_job_status(session, job_id)
+
+
+def remote_cancel_job(job_id: str) -> str:
+    """
+    Cancel a background job started with remote_start_job.
+    All processes of the job are terminated.
+
+    Args:
+        job_id: The job id returned by remote_start_job.
+    """
+
+    session = get_session()
+    instance = session.get_instance()
+    command = CANCEL_JOB_COMMAND.format(job_dir=_get_job_dir(session, job_id))
+    run_command(instance, command)
+    return _get_job_status(session, job_id)
 
 
 def create_remote_text_editor(
     text_editor_func: Callable[..., str],
+    session: Optional[RemoteSession] = None,
 ) -> Callable[..., str]:
     @functools.wraps(text_editor_func)
     def wrapper(*args: Any, **kwargs: Any) -> str:
-        init_all()
-        assert _instance_info
+        current_session = session or get_session()
+        instance = current_session.get_instance()
 
         args_dict = {k: v for k, v in kwargs.items()}
         if args:
             args_dict.update(dict(zip(("command", "path"), args)))
         path = args_dict["path"]
         command = args_dict["command"]
+        local_path = current_session.mirror_dir / path
+        remote_path = current_session.remote_path(path)
 
-        if command != "write":
-            recieve_rsync(_instance_info, f"/root/{path}", f"{WORKSPACE_DIR_PATH}")
+        if command != "write" and not current_session.is_synced(path, local_path):
+            local_path.parent.mkdir(parents=True, exist_ok=True)
+            recieve_rsync(instance, remote_path, str(local_path.parent))
+            current_session.mark_synced(path, local_path)
 
-        result: str = text_editor_func(*args, **kwargs)
+        # The editor works with paths relative to the workspace
+        args_dict["path"] = str(local_path.relative_to(WORKSPACE_DIR_PATH))
+        result: str = text_editor_func(**args_dict)
 
-        if command != "view":
-            send_rsync(_instance_info, f"{WORKSPACE_DIR_PATH}/{path}", "/root")
+        if command != "view" and not current_session.is_synced(path, local_path):
+            send_file(instance, local_path, remote_path)
+            current_session.mark_synced(path, local_path)
 
         return result
 
@@ -335,3 +1079,7 @@ def create_remote_text_editor(
         wrapper.__doc__ = "Executes on a remote machine with GPU.\n" + new_doc
         wrapper.__name__ = "remote_text_editor"
     return wrapper
+
+
+if __name__ == "__main__":
+    fire.Fire(reap_idle_instances)
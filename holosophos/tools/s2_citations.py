@@ -3,12 +3,13 @@
 
 import json
 from typing import Optional, List, Dict, Any
-from urllib3.util.retry import Retry
 import time
 import random
 
 import requests
 
+from holosophos import http_client
+
 OLD_API_URL_TEMPLATE = "https://api.semanticscholar.org/v1/paper/{paper_id}"
 GRAPH_URL_TEMPLATE = "https://api.semanticscholar.org/graph/v1/paper/{paper_id}/citations?fields={fields}&offset={offset}&limit={limit}"
 FIELDS = "title,authors,externalIds,venue,citationCount,publicationDate"
@@ -20,20 +21,9 @@ with open(WORKING_PROXIES_FILE, "r") as f:
 a = 1
 
 def _get_results(url: str, proxies: Optional[Dict[str, str]] = None) -> requests.Response:
-    retry_strategy = Retry(
-        total=1,
-        backoff_factor=30,
-        status_forcelist=[429, 500, 502, 503, 504],
-        allowed_methods=["GET"],
-    )
-
-    session = requests.Session()
-    adapter = requests.adapters.HTTPAdapter(max_retries=retry_strategy)
-    session.mount("https://", adapter)
-
     try:
         time.sleep(random.uniform(1, 3))
-        response = session.get(url, timeout=30, proxies=proxies)
+        response = http_client.get(url, proxies=proxies)
         response.raise_for_status()
         return response
     except (
@@ -42,12 +32,10 @@ def _get_results(url: str, proxies: Optional[Dict[str, str]] = None) -> requests
         requests.exceptions.HTTPError,
         requests.exceptions.ProxyError,
     ) as e:
-        print(f"Failed after {retry_strategy.total} retries: {str(e)}")
+        print(f"Failed after {http_client.RETRY_STRATEGY.total} retries: {str(e)}")
         print(f"Proxy failed: {proxies}. Error: {str(e)}")
         raise
 
-    return response
-
 
 def _format_authors(authors: List[Dict[str, Any]]) -> List[str]:
     return [a["name"] for a in authors]
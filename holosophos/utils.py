@@ -1,11 +1,33 @@
+import os
+import re
+import fcntl
+import json
+import hashlib
+import multiprocessing
 from pathlib import Path
 from typing import Any, Optional, Dict, List
+from concurrent.futures import ProcessPoolExecutor
 
 import yaml
-import requests
 from pypdf import PdfReader
 
-from holosophos.files import PROMPTS_DIR_PATH
+from holosophos import http_client
+from holosophos.cache import DiskCache
+from holosophos.files import PROMPTS_DIR_PATH, CACHE_DIR_PATH
+
+PDF_PARSE_WORKERS = int(os.getenv("PDF_PARSE_WORKERS", min(4, os.cpu_count() or 1)))
+PDF_MIN_PAGES_PER_WORKER = 8
+PDF_DOWNLOAD_MAX_SIZE = 200 * 1024 * 1024
+PDF_DOWNLOAD_CHUNK_SIZE = 64 * 1024
+PDF_MAGIC = b"%PDF-"
+PDF_DOWNLOAD_LOCKS_DIR_PATH = CACHE_DIR_PATH / "download_locks"
+# Bump when the text extraction changes
+PDF_TEXT_CACHE_VERSION = 1
+PDF_TEXT_CACHE_MAX_SIZE = 512 * 1024 * 1024
+
+_pdf_text_cache = DiskCache(
+    CACHE_DIR_PATH / "pdf_text.sqlite", max_size=PDF_TEXT_CACHE_MAX_SIZE
+)
 
 
 def get_prompt(template_name: str) -> Dict[str, Any]:
@@ -63,26 +85,142 @@ def truncate_content(
     return prefix + disclaimer + suffix
 
 
-def download_pdf(url: str, output_path: Path) -> None:
-    response = requests.get(url)
-    response.raise_for_status()
-    content_type = response.headers.get("content-type")
-    assert content_type
-    assert "application/pdf" in content_type.lower()
-    with open(output_path.resolve(), "wb") as fp:
-        fp.write(response.content)
+def tokenize(text: str) -> List[str]:
+    return re.findall(r"\w+", text.lower())
 
 
-def parse_pdf_file(pdf_path: Path) -> List[str]:
-    # Why not Marker? Because it is too heavy.
-    reader = PdfReader(str(pdf_path.resolve()))
+def download_pdf(
+    url: str, output_path: Path, max_size: int = PDF_DOWNLOAD_MAX_SIZE
+) -> None:
+    # Workers downloading the same file wait for each other instead of
+    # writing the same ".part" file at the same time
+    output_path = output_path.resolve()
+    # Lock files live in the cache, so they don't show up in the workspace
+    path_hash = hashlib.sha256(str(output_path).encode()).hexdigest()
+    lock_path = PDF_DOWNLOAD_LOCKS_DIR_PATH / f"{path_hash}.lock"
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            if output_path.exists():
+                return
+            if not _download_pdf_part(url, output_path, max_size):
+                _download_pdf_part(url, output_path, max_size)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _download_pdf_part(url: str, output_path: Path, max_size: int) -> bool:
+    # Stream into a ".part" file and rename it at the end,
+    # so that an interrupted download is resumed and never looks like a complete file.
+    # Returns False if the ".part" file can't be resumed and was removed.
+    part_path = output_path.with_name(output_path.name + ".part")
+    downloaded = part_path.stat().st_size if part_path.exists() else 0
+    headers = {"Range": f"bytes={downloaded}-"} if downloaded else dict()
 
+    with http_client.stream(url, headers=headers) as response:
+        if downloaded and response.status_code == 416:
+            # The host slot is released before the download starts over
+            part_path.unlink()
+            return False
+        response.raise_for_status()
+        content_type = response.headers.get("content-type")
+        assert content_type
+        assert "application/pdf" in content_type.lower()
+        if response.status_code != 206:
+            downloaded = 0
+
+        content_length = response.headers.get("content-length")
+        if content_length and downloaded + int(content_length) > max_size:
+            part_path.unlink(missing_ok=True)
+            raise AssertionError(f"PDF is too large: {url}, max size is {max_size}")
+
+        head = b""
+        with open(part_path, "ab" if downloaded else "wb") as fp:
+            for chunk in response.iter_content(chunk_size=PDF_DOWNLOAD_CHUNK_SIZE):
+                if downloaded + len(chunk) > max_size:
+                    fp.close()
+                    part_path.unlink()
+                    raise AssertionError(
+                        f"PDF is too large: {url}, max size is {max_size}"
+                    )
+                if downloaded < len(PDF_MAGIC):
+                    head += chunk[: len(PDF_MAGIC) - downloaded]
+                    if len(head) == len(PDF_MAGIC) and head != PDF_MAGIC:
+                        fp.close()
+                        part_path.unlink()
+                        raise AssertionError(f"Not a PDF file: {url}")
+                fp.write(chunk)
+                downloaded += len(chunk)
+
+    with open(part_path, "rb") as fp:
+        is_pdf = fp.read(len(PDF_MAGIC)) == PDF_MAGIC
+    if not is_pdf:
+        part_path.unlink()
+        raise AssertionError(f"Not a PDF file: {url}")
+    os.replace(part_path, output_path)
+    return True
+
+
+def _extract_pages(reader: PdfReader, start: int, end: int) -> List[str]:
     pages = []
-    for page_number, page in enumerate(reader.pages, start=1):
+    for page_number in range(start, end):
         try:
-            text = page.extract_text()
-            prefix = f"## Page {page_number}\n\n"
+            text = reader.pages[page_number].extract_text()
+            prefix = f"## Page {page_number + 1}\n\n"
             pages.append(prefix + text)
         except Exception:
             continue
     return pages
+
+
+def _extract_pages_from_file(pdf_path: str, start: int, end: int) -> List[str]:
+    return _extract_pages(PdfReader(pdf_path), start, end)
+
+
+def hash_file(path: Path) -> str:
+    file_hash = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+
+def parse_pdf_file(
+    pdf_path: Path, num_workers: Optional[int] = None, use_cache: bool = True
+) -> List[str]:
+    # Extracted texts are cached by the hash of the file content, not by its name
+    cache_key = f"{hash_file(pdf_path)}:{PDF_TEXT_CACHE_VERSION}"
+    if use_cache:
+        cached_pages = _pdf_text_cache.get(cache_key)
+        if cached_pages is not None:
+            pages: List[str] = json.loads(cached_pages)
+            return pages
+
+    pages = _parse_pdf_pages(pdf_path, num_workers)
+    if use_cache:
+        _pdf_text_cache.set(cache_key, json.dumps(pages).encode("utf-8"))
+    return pages
+
+
+def _parse_pdf_pages(pdf_path: Path, num_workers: Optional[int] = None) -> List[str]:
+    # Why not Marker? Because it is too heavy.
+    path = str(pdf_path.resolve())
+    reader = PdfReader(path)
+    num_pages = len(reader.pages)
+
+    num_workers = num_workers if num_workers is not None else PDF_PARSE_WORKERS
+    num_workers = min(num_workers, num_pages // PDF_MIN_PAGES_PER_WORKER)
+    if num_workers <= 1:
+        return _extract_pages(reader, 0, num_pages)
+
+    # Every worker opens the file on its own and extracts a contiguous range of pages
+    chunk_size = (num_pages + num_workers - 1) // num_workers
+    starts = list(range(0, num_pages, chunk_size))
+    ends = [min(start + chunk_size, num_pages) for start in starts]
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=num_workers, mp_context=context) as executor:
+        chunks = executor.map(
+            _extract_pages_from_file, [path] * len(starts), starts, ends
+        )
+        return [page for chunk in chunks for page in chunk]
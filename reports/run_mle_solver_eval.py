@@ -1,9 +1,12 @@
 import json
 from typing import Any, Optional
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 
 import fire  # type: ignore
+from tqdm import tqdm
 from holosophos.main_agent import run_main_agent
+from holosophos.tools import configure_scheduler
 
 
 @dataclass
@@ -19,12 +22,19 @@ def run_eval(
     input_path: str,
     model_name: str = "gpt-4o-mini",
     max_workers: int = 1,
+    max_instances: Optional[int] = None,
+    sessions_per_instance: int = 1,
     verbosity_level: int = 2,
     nrows: Optional[int] = None,
     enable_phoenix: bool = False,
     phoenix_project_name: str = "holosophos",
     phoenix_endpoint: str = "https://app.phoenix.arize.com/v1/traces",
 ) -> None:
+    # Workers beyond the instance budget wait for a free instance
+    configure_scheduler(
+        max_instances=max_instances or max_workers,
+        sessions_per_instance=sessions_per_instance,
+    )
     with open(input_path) as f:
         records = [json.loads(line) for line in f]
     if nrows:
@@ -44,9 +54,18 @@ def run_eval(
         )
         return answer
 
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(
+            tqdm(
+                executor.map(worker, tasks),
+                total=len(tasks),
+                desc="Processing queries",
+                unit="query",
+            )
+        )
+
     correct_count = 0
-    for record, task in zip(records, tasks):
-        result = worker(task)
+    for record, result in zip(records, results):
         query = record["query"]
         field = record["field"]
         target = record["target"]
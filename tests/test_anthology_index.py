@@ -0,0 +1,103 @@
+from pathlib import Path
+from typing import Any, Dict, List
+
+from holosophos.tools.anthology_index import AnthologyIndex
+
+
+def _record(
+    full_id: str, title: str, abstract: str, authors: List[str], year: int
+) -> Dict[str, Any]:
+    return {
+        "id": full_id,
+        "title": title,
+        "authors": ", ".join(authors),
+        "author_names": "\n".join(authors),
+        "abstract": abstract,
+        "year": year,
+        "categories": full_id.split(".")[1].split("-")[0],
+        "comment": "",
+        "url": f"https://aclanthology.org/{full_id}.pdf",
+    }
+
+
+RECORDS = [
+    _record(
+        "2019.naacl-main.1",
+        "BERT: Pre-training of Deep Bidirectional Transformers",
+        "We introduce a new language representation model called BERT.",
+        ["Jacob Devlin", "Kristina Toutanova"],
+        2019,
+    ),
+    _record(
+        "2020.acl-main.2",
+        "Don't Stop Pretraining",
+        "Language models pretrained on text from a wide variety of sources.",
+        ["Suchin Gururangan"],
+        2020,
+    ),
+    _record(
+        "2024.emnlp-main.695",
+        "The Mystery of the Pathological Path-star Task for Language Models",
+        "The recently introduced path-star task is a minimal task.",
+        ["Arvid Frydenlund"],
+        2024,
+    ),
+]
+
+
+def test_anthology_index_fields() -> None:
+    index = AnthologyIndex.from_records(RECORDS)
+    assert index.search("ti:BERT") == {0}
+    assert index.search('abs:"language models"') == {1}
+    assert index.search("au:devlin") == {0}
+    assert index.search('au:"kristina toutanova"') == {0}
+    assert index.search("cat:emnlp") == {2}
+    assert index.search("id:2024.emnlp-main.695") == {2}
+    assert index.search("all:language") == {0, 1, 2}
+    assert index.search("abs:missing") == set()
+
+
+def test_anthology_index_operators() -> None:
+    index = AnthologyIndex.from_records(RECORDS)
+    assert index.search("abs:language AND ti:pretraining") == {1}
+    assert index.search("ti:bert OR ti:mystery") == {0, 2}
+    assert index.search("all:language ANDNOT au:devlin") == {1, 2}
+    assert index.search("(ti:bert OR ti:mystery) ANDNOT au:frydenlund") == {0}
+
+
+def test_anthology_index_dates_and_sorting() -> None:
+    index = AnthologyIndex.from_records(RECORDS)
+    found = index.search("all:language", start_year=2020)
+    assert found == {1, 2}
+    assert index.rank(found, "all:language", limit=5, sort_by="published") == [2, 1]
+    assert index.rank(
+        found, "all:language", limit=5, sort_by="published", sort_order="ascending"
+    ) == [1, 2]
+    assert index.rank(found, "all:language", limit=1, sort_by="published") == [2]
+
+
+def test_anthology_index_relevance() -> None:
+    index = AnthologyIndex.from_records(RECORDS)
+    query = "abs:language OR ti:task"
+    found = index.search(query)
+    assert found == {0, 1, 2}
+    ranked = index.rank(found, query, limit=3)
+    assert ranked[0] == 2
+    assert index.rank(found, query, limit=1) == ranked[:1]
+    assert index.rank(found, query, limit=3, sort_order="ascending") == ranked[::-1]
+    assert index.rank({0, 1}, "au:devlin OR au:gururangan", limit=2) == [0, 1]
+
+
+def test_anthology_index_snapshot(tmp_path: Path) -> None:
+    path = tmp_path / "snapshot.bin"
+    index = AnthologyIndex.from_records(RECORDS, metadata={"upstream_commit": "abc"})
+    index.save(path)
+
+    loaded = AnthologyIndex.load(path)
+    assert len(loaded) == len(RECORDS)
+    assert loaded.metadata == {"upstream_commit": "abc"}
+    assert loaded.get_record(2) == RECORDS[2]
+    for query in ("ti:bert OR ti:mystery", 'abs:"language models"', "cat:acl"):
+        found = index.search(query)
+        assert loaded.search(query) == found
+        assert loaded.rank(found, query, limit=3) == index.rank(found, query, limit=3)
@@ -1,6 +1,12 @@
+import importlib
+import threading
+from pathlib import Path
+
 import pytest
 
 from holosophos.tools import anthology_search
+from holosophos.tools.anthology_index import AnthologyIndex
+from tests.test_anthology_index import RECORDS
 
 
 def test_anthology_search_basic_search() -> None:
@@ -107,3 +113,30 @@ def test_anthology_search_start_date_only() -> None:
 def test_anthology_find_conf() -> None:
     result = anthology_search('au:wendler AND ti:"Do Llamas work"')
     assert "2024.acl-long.820" in result
+
+
+def test_anthology_search_background_refresh(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    module = importlib.import_module("holosophos.tools.anthology_search")
+    snapshot_path = tmp_path / "snapshot.bin"
+    AnthologyIndex.from_records(RECORDS[:1]).save(snapshot_path)
+    new_index = AnthologyIndex.from_records(RECORDS)
+    is_built = threading.Event()
+
+    def build_anthology_snapshot() -> AnthologyIndex:
+        assert is_built.wait(timeout=10)
+        return new_index
+
+    monkeypatch.setattr(module, "SNAPSHOT_PATH", snapshot_path)
+    monkeypatch.setattr(module, "_is_snapshot_fresh", lambda snapshot: False)
+    monkeypatch.setattr(module, "build_anthology_snapshot", build_anthology_snapshot)
+    monkeypatch.setattr(module.AnthologyIndexSingleton, "instance", None)
+
+    # The old snapshot is served while the new one is built
+    assert len(module.AnthologyIndexSingleton.get()) == 1
+    is_built.set()
+    refresh_thread = module.AnthologyIndexSingleton.refresh_thread
+    assert refresh_thread is not None
+    refresh_thread.join(timeout=10)
+    assert module.AnthologyIndexSingleton.get() is new_index
@@ -1,3 +1,14 @@
+import json
+import time
+import importlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import bs4
+import pytest
+import requests
+
+from holosophos.cache import DiskCache
 from holosophos.tools import arxiv_download
 
 
@@ -23,3 +34,170 @@ def test_arxiv_download_bug() -> None:
 
     paper = arxiv_download("2412.08389v1")
     assert "enhance the efficacy of ESC systems" in paper
+
+
+def test_arxiv_download_cache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    module = importlib.import_module("holosophos.tools.arxiv_download")
+    calls: List[str] = []
+
+    def parse_abs(paper_id: str) -> Dict[str, str]:
+        calls.append(paper_id)
+        return {"title": "Title", "abstract": "Abstract"}
+
+    def parse_html(
+        paper_id: str, section_indices: Optional[List[int]] = None
+    ) -> Dict[str, Any]:
+        return {
+            "toc": "",
+            "sections": ["Section"],
+            "citations": [],
+            "original_format": "html",
+        }
+
+    monkeypatch.setattr(
+        module, "_cache", DiskCache(tmp_path / "cache.sqlite", memory_size=1)
+    )
+    monkeypatch.setattr(module, "_parse_abs", parse_abs)
+    monkeypatch.setattr(module, "_parse_html", parse_html)
+
+    first = json.loads(arxiv_download("1234.5678v1", include_citations=True))
+    second = json.loads(arxiv_download("1234.5678v1"))
+    assert calls == ["1234.5678v1"]
+    assert "citations" in first
+    assert "citations" not in second
+    assert first["sections"] == second["sections"] == ["Section"]
+
+
+def test_arxiv_download_concurrent_fetch(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    module = importlib.import_module("holosophos.tools.arxiv_download")
+
+    def parse_abs(paper_id: str) -> Dict[str, str]:
+        time.sleep(0.5)
+        return {"title": "Title", "abstract": "Abstract"}
+
+    def parse_html(
+        paper_id: str, section_indices: Optional[List[int]] = None
+    ) -> Dict[str, Any]:
+        raise requests.exceptions.HTTPError("404")
+
+    def parse_pdf(paper_id: str) -> Dict[str, Any]:
+        time.sleep(0.5)
+        return {"toc": "", "sections": [], "citations": [], "original_format": "pdf"}
+
+    monkeypatch.setattr(module, "_cache", DiskCache(tmp_path / "cache.sqlite"))
+    monkeypatch.setattr(module, "_parse_abs", parse_abs)
+    monkeypatch.setattr(module, "_parse_html", parse_html)
+    monkeypatch.setattr(module, "_parse_pdf", parse_pdf)
+
+    start_time = time.time()
+    paper = json.loads(arxiv_download("1234.5678v1"))
+    assert time.time() - start_time < 0.9
+    assert paper["original_format"] == "pdf"
+    assert paper["title"] == "Title"
+
+
+def test_arxiv_download_html_server_error(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    module = importlib.import_module("holosophos.tools.arxiv_download")
+
+    def fetch_article(paper_id: str) -> bs4.element.Tag:
+        # Raised by the session when retries on 5xx responses are exhausted
+        raise requests.exceptions.RetryError("Max retries exceeded")
+
+    def parse_pdf(paper_id: str) -> Dict[str, Any]:
+        return {"toc": "", "sections": [], "citations": [], "original_format": "pdf"}
+
+    monkeypatch.setattr(module, "_cache", DiskCache(tmp_path / "cache.sqlite"))
+    monkeypatch.setattr(
+        module, "_parse_abs", lambda paper_id: {"title": "Title", "abstract": ""}
+    )
+    monkeypatch.setattr(module, "_fetch_article", fetch_article)
+    monkeypatch.setattr(module, "_parse_pdf", parse_pdf)
+
+    paper = json.loads(arxiv_download("1234.5678v1"))
+    assert paper["original_format"] == "pdf"
+
+
+ARTICLE_HTML = """
+<article>
+<h1>Paper</h1>
+<section id="S1"><h2>1 Introduction</h2><p>Intro text.</p></section>
+<section id="S2"><h2>2 Method</h2><p>Method text.</p></section>
+<section id="S3"><h2>3 Results</h2><p>Results text.</p></section>
+</article>
+"""
+
+
+def test_arxiv_download_sections(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    module = importlib.import_module("holosophos.tools.arxiv_download")
+    article = bs4.BeautifulSoup(ARTICLE_HTML, features="lxml").article
+    converted: List[str] = []
+    convert_soup_to_md = module._convert_soup_to_md
+
+    def convert(soup: bs4.element.Tag, url: str) -> str:
+        converted.append(str(soup["id"]))
+        result: str = convert_soup_to_md(soup, url)
+        return result
+
+    def parse_abs(paper_id: str) -> Dict[str, str]:
+        return {"title": "Title", "abstract": "Abstract"}
+
+    monkeypatch.setattr(module, "_cache", DiskCache(tmp_path / "cache.sqlite"))
+    monkeypatch.setattr(module, "_parse_abs", parse_abs)
+    monkeypatch.setattr(module, "_fetch_article", lambda paper_id: article)
+    monkeypatch.setattr(module, "_convert_soup_to_md", convert)
+
+    paper = json.loads(arxiv_download("1234.5678v1", include_sections=False))
+    assert "sections" not in paper
+    assert "Method (index in 'sections': 1)" in paper["toc"]
+    assert converted == []
+
+    paper = json.loads(arxiv_download("1234.5678v1", section_indices=[2, 1]))
+    assert paper["section_indices"] == [2, 1]
+    assert "Results text." in paper["sections"][0]
+    assert "Method text." in paper["sections"][1]
+    assert converted == ["S3", "S2"]
+
+    with pytest.raises(AssertionError):
+        arxiv_download("1234.5678v1", section_indices=[3])
+
+
+class FakeResponse:
+    def __init__(self, text: str) -> None:
+        self.text = text
+
+    def raise_for_status(self) -> None:
+        pass
+
+
+def test_arxiv_download_sections_cache(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    module = importlib.import_module("holosophos.tools.arxiv_download")
+    urls: List[str] = []
+    abs_page = '<h1 class="title">Paper</h1><div class="abstract">Abstract</div>'
+
+    def fake_get(url: str, **kwargs: Any) -> FakeResponse:
+        urls.append(url)
+        return FakeResponse(ARTICLE_HTML if "/html/" in url else abs_page)
+
+    monkeypatch.setattr(module, "_cache", DiskCache(tmp_path / "cache.sqlite"))
+    monkeypatch.setattr(module.http_client, "get", fake_get)
+    module._fetch_article.cache_clear()
+
+    paper = json.loads(arxiv_download("1234.5678v1", include_sections=False))
+    assert "Method" in paper["toc"]
+    assert len(urls) == 2
+
+    # Other processes get the pages from the persistent cache
+    module._fetch_article.cache_clear()
+    paper = json.loads(arxiv_download("1234.5678v1", section_indices=[1]))
+    assert "Method text." in paper["sections"][0]
+    assert paper["title"] == "Paper"
+    assert len(urls) == 2
+    module._fetch_article.cache_clear()
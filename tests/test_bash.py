@@ -1,8 +1,20 @@
 import os
+import time
+import struct
+import socket as pysocket
+import importlib
+import threading
+import subprocess
+from types import SimpleNamespace
+from typing import Any, List
+
+import pytest
 
 from holosophos.tools import bash
 from holosophos.files import WORKSPACE_DIR_PATH
 
+bash_module = importlib.import_module("holosophos.tools.bash")
+
 
 def test_bash() -> None:
     result = bash('echo "Hello World"')
@@ -16,3 +28,123 @@ def test_bash() -> None:
 
     result = bash("fddafad")
     assert "fddafad: command not found" in result
+
+
+class FakeDockerAPI:
+    # Runs a local bash and frames its output like the docker daemon without a tty
+    def exec_create(self, container_id: str, cmd: List[str], **kwargs: Any) -> Any:
+        return {"Id": "exec"}
+
+    def exec_start(self, exec_id: str, socket: bool) -> pysocket.socket:
+        server, client = pysocket.socketpair()
+        process = subprocess.Popen(
+            ["bash"], stdin=server.fileno(), stdout=subprocess.PIPE, bufsize=0
+        )
+
+        def send_frames() -> None:
+            assert process.stdout
+            while data := os.read(process.stdout.fileno(), 7):
+                server.sendall(struct.pack(">BxxxL", 1, len(data)) + data)
+            server.close()
+
+        threading.Thread(target=send_frames, daemon=True).start()
+        return client
+
+
+class FakeContainer:
+    client = SimpleNamespace(api=FakeDockerAPI())
+
+    def __init__(self, name: str = "bash_runner") -> None:
+        self.id = name
+        self.is_removed = False
+        self.num_resets = 0
+
+    def exec_run(self, cmd: List[str]) -> Any:
+        if cmd == bash_module.RESET_CONTAINER_COMMAND:
+            # It would kill every local process
+            self.num_resets += 1
+            return None
+        return subprocess.run(cmd, capture_output=True)
+
+    def remove(self, force: bool) -> None:
+        self.is_removed = True
+
+
+class FakeDockerClient:
+    def __init__(self, max_containers: int) -> None:
+        self.containers = self
+        self.max_containers = max_containers
+        self.started: List[FakeContainer] = []
+
+    def run(self, image: str, command: str, name: str, **kwargs: Any) -> Any:
+        assert kwargs["labels"] == {bash_module.CONTAINER_LABEL: str(os.getpid())}
+        if len(self.started) >= self.max_containers:
+            raise Exception("Too many containers")
+        self.started.append(FakeContainer(name))
+        return self.started[-1]
+
+
+def test_bash_docker_shell_session() -> None:
+    session = bash_module.DockerShellSession(FakeContainer())
+    try:
+        assert session.run("cd /tmp && export HS_TEST=42") == ("", 0)
+        assert session.run("pwd; echo $HS_TEST; false") == ("/tmp\n42\n", 1)
+        start_time = time.monotonic()
+        with pytest.raises(TimeoutError):
+            session.run("sleep 30 | cat", timeout=1)
+        assert time.monotonic() - start_time < 10
+        assert session.run("echo $HS_TEST") == ("42\n", 0)
+    finally:
+        session.close()
+
+
+def test_bash_container_pool() -> None:
+    client = FakeDockerClient(max_containers=2)
+    pool = bash_module.ContainerPool(size=1, client=client)
+    pool.fill()
+    assert len(client.started) == 1
+    sessions = [bash_module.BashSession(pool) for _ in range(3)]
+    try:
+        first_shell = sessions[0].get_shell()
+        assert first_shell.container is client.started[0]
+        assert first_shell.is_alive
+        assert pool._fill_thread is not None
+        pool._fill_thread.join(timeout=10)
+        assert len(client.started) == 2
+        assert client.started[0].id != client.started[1].id
+
+        second_shell = sessions[1].get_shell()
+        assert second_shell.container is client.started[1]
+        pool._fill_thread.join(timeout=10)
+        assert len(client.started) == 2
+
+        # The first container is recycled, the pool is full for the second one
+        first_shell.run("export HS_TEST=42")
+        sessions[0].close()
+        sessions[1].close()
+        assert client.started[0].num_resets == 1
+        assert not client.started[0].is_removed
+        assert client.started[1].is_removed
+
+        bound_bash = bash_module.bind_bash_tool(bash_module.bash, sessions[2])
+        assert bound_bash("echo ${HS_TEST:-empty}") == "empty"
+        assert sessions[2].shell is not None
+        assert sessions[2].shell.container is client.started[0]
+    finally:
+        pool.shutdown()
+    assert all(container.is_removed for container in client.started)
+
+
+def test_bash_session_warms_pool() -> None:
+    client = FakeDockerClient(max_containers=1)
+    pool = bash_module.ContainerPool(size=1, client=client)
+    session = bash_module.BashSession(pool)
+    try:
+        assert pool._fill_thread is not None
+        pool._fill_thread.join(timeout=10)
+        assert len(client.started) == 1
+        assert session.shell is None
+        assert session.get_shell().container is client.started[0]
+    finally:
+        session.close()
+        pool.shutdown()
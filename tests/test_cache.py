@@ -0,0 +1,61 @@
+import os
+import time
+from pathlib import Path
+
+from holosophos.cache import DiskCache
+
+
+def test_cache_get_set(tmp_path: Path) -> None:
+    cache = DiskCache(tmp_path / "cache.sqlite")
+    assert cache.get("key") is None
+    cache.set("key", b"value")
+    assert cache.get("key") == b"value"
+    assert cache.stats.hits == 1
+    assert cache.stats.misses == 1
+    assert len(cache) == 1
+
+    cache.delete("key")
+    assert cache.get("key") is None
+
+
+def test_cache_missing_dir(tmp_path: Path) -> None:
+    cache = DiskCache(tmp_path / "missing" / "cache.sqlite")
+    cache.set("key", b"value")
+    assert cache.get("key") == b"value"
+
+
+def test_cache_ttl(tmp_path: Path) -> None:
+    cache = DiskCache(tmp_path / "cache.sqlite", ttl=1)
+    cache.set("key", b"value")
+    cache.set("forever", b"value", ttl=1000)
+    assert cache.get("key") == b"value"
+    time.sleep(1.1)
+    assert cache.get("key") is None
+    assert cache.get("forever") == b"value"
+
+
+def test_cache_lru_eviction(tmp_path: Path) -> None:
+    value = os.urandom(1000)
+    cache = DiskCache(tmp_path / "cache.sqlite", max_size=3500)
+    cache.set("first", value)
+    cache.set("second", value)
+    cache.set("third", value)
+    assert cache.get("first") == value
+    cache.set("fourth", value)
+    assert cache.get("second") is None
+    assert cache.get("first") == value
+    assert cache.get("fourth") == value
+    assert cache.stats.evictions == 1
+
+
+def test_cache_memory_front(tmp_path: Path) -> None:
+    cache = DiskCache(tmp_path / "cache.sqlite", memory_size=1)
+    cache.set("first", b"1")
+    cache.set("second", b"2")
+    assert list(cache._memory.values()) == [(b"2", None)]
+    assert cache.get("first") == b"1"
+    assert cache.get("second") == b"2"
+    assert cache.stats.hits == 2
+
+    cache.delete("second")
+    assert cache.get("second") is None
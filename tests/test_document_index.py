@@ -0,0 +1,30 @@
+from typing import List, Sequence
+
+from holosophos.tools.document_index import DocumentIndex
+
+CHUNKS = [
+    "The Transformer is based solely on attention mechanisms.",
+    "Our model achieves 28.4 BLEU on the WMT 2014 English-to-German task.",
+    "We trained the model on eight GPUs for 3.5 days.",
+    "The Transformer generalizes well to English constituency parsing.",
+]
+
+
+def _embed(texts: List[str]) -> Sequence[Sequence[float]]:
+    keywords = ("gpu", "bleu", "parsing")
+    return [[float(k in text.lower()) for k in keywords] + [0.1] for text in texts]
+
+
+def test_document_index_bm25() -> None:
+    index = DocumentIndex(CHUNKS)
+    assert len(index) == 4
+    assert index.search("BLEU score, WMT 2014", top_k=2) == [1]
+    assert index.search("transformer", top_k=1)[0] in (0, 3)
+    assert index.search("unrelated words", top_k=2) == []
+
+
+def test_document_index_embeddings() -> None:
+    index = DocumentIndex(CHUNKS, embedder=_embed)
+    found = index.search("How many GPUs?", top_k=2)
+    assert found[0] == 2
+    assert len(found) == 2
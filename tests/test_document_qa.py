@@ -1,6 +1,14 @@
+import threading
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
 from smolagents import LiteLLMModel  # type: ignore
 
+from holosophos.cache import DiskCache
 from holosophos.tools import DocumentQATool, arxiv_download
+from holosophos.tools import document_qa
+from holosophos.tools.document_qa import NO_ANSWER, PROMPT, split_document
 
 
 DOCUMENT1 = """
@@ -19,6 +27,13 @@ English constituency parsing both with large and limited training data.
 """
 
 
+@pytest.fixture(autouse=True)
+def answer_cache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> DiskCache:
+    cache = DiskCache(tmp_path / "document_qa.sqlite")
+    monkeypatch.setattr(document_qa, "_cache", cache)
+    return cache
+
+
 def test_document_qa_base() -> None:
     #model = LiteLLMModel(model_id="gpt-4o-mini", temperature=0.0)
     model = LiteLLMModel(model_id="litellm_proxy/arcee-ai-Arcee-Agent-AWQ-4bit-smashed", temperature=0.0)
@@ -38,3 +53,89 @@ def test_document_qa_real_question() -> None:
     document = arxiv_download("2409.06820")
     answer = tool(questions=questions, document=document)
     assert "4.62" in answer or "4.68" in answer
+
+
+class FakeModel:
+    def __init__(self) -> None:
+        self.prompts: List[str] = []
+        self.lock = threading.Lock()
+
+    def __call__(self, messages: List[Dict[str, str]]) -> str:
+        prompt = messages[-1]["content"]
+        with self.lock:
+            self.prompts.append(prompt)
+        if "Partial answers:" in prompt:
+            return "Final: " + prompt.split("Partial answers:")[1]
+        return "BLEU is 28.4" if "28.4" in prompt.split("BEGIN")[1] else NO_ANSWER
+
+
+def test_document_qa_split_document() -> None:
+    document = " ".join(f"w{i}" for i in range(10))
+    assert split_document(document, chunk_size=20, chunk_overlap=2) == [document]
+    chunks = split_document(document, chunk_size=4, chunk_overlap=1)
+    assert chunks == ["w0 w1 w2 w3", "w3 w4 w5 w6", "w6 w7 w8 w9"]
+
+
+def test_document_qa_chunked() -> None:
+    model = FakeModel()
+    tool = DocumentQATool(model, mode="chunked", chunk_size=30, chunk_overlap=5)
+    answer = tool(
+        questions="What is BLEU on the WMT 2014 English-to-German translation task?",
+        document=DOCUMENT1,
+    )
+    assert answer.startswith("Final:")
+    assert "28.4" in answer
+    assert NO_ANSWER not in answer
+    assert len(model.prompts) == len(split_document(DOCUMENT1, 30, 5)) + 1
+
+    model = FakeModel()
+    tool = DocumentQATool(model, chunk_size=30, chunk_overlap=5)
+    tool(questions="What is BLEU?", document=DOCUMENT1)
+    assert len(model.prompts) == 1
+
+
+def test_document_qa_chunked_partial_answers() -> None:
+    def model(messages: List[Dict[str, str]]) -> str:
+        prompt = messages[-1]["content"]
+        if "Partial answers:" in prompt:
+            return "Final: " + prompt.split("Partial answers:")[1]
+        if "28.4" in prompt.split("BEGIN")[1]:
+            return f"1. BLEU is 28.4\n2. {NO_ANSWER}"
+        return f" {NO_ANSWER}.\n"
+
+    tool = DocumentQATool(model, mode="chunked", chunk_size=30, chunk_overlap=5)
+    answer = tool(questions="1. What is BLEU?\n2. What is the batch size?", document=DOCUMENT1)
+    assert "BLEU is 28.4" in answer
+    assert answer.count("==== ANSWER FROM FRAGMENT") == 1
+
+
+def test_document_qa_retrieval() -> None:
+    model = FakeModel()
+    tool = DocumentQATool(
+        model, mode="retrieval", retrieval_chunk_size=20, retrieval_chunk_overlap=0, top_k=1
+    )
+    questions = "What is BLEU on the WMT 2014 English-to-German translation task?"
+    answer = tool(questions=questions, document=DOCUMENT1)
+    assert "28.4" in answer
+    assert len(model.prompts) == 1
+    assert len(model.prompts[0]) < len(PROMPT.format(questions=questions, document=DOCUMENT1))
+
+    index = tool.get_index(DOCUMENT1)
+    tool(questions="Which GPUs were used?", document=DOCUMENT1)
+    assert tool.get_index(DOCUMENT1) is index
+
+
+def test_document_qa_answer_cache(answer_cache: DiskCache) -> None:
+    model = FakeModel()
+    tool = DocumentQATool(model)
+    questions = "What is BLEU on the WMT 2014 English-to-German translation task?"
+    answer = tool(questions=questions, document=DOCUMENT1)
+    assert tool(questions=questions.upper() + "  ", document=DOCUMENT1) == answer
+    assert len(model.prompts) == 1
+    assert answer_cache.stats.hits == 1
+
+    tool(questions=questions, document=DOCUMENT1 + "Extra sentence.")
+    DocumentQATool(model, mode="chunked").forward(questions, DOCUMENT1)
+    DocumentQATool(model, use_cache=False).forward(questions, DOCUMENT1)
+    assert len(model.prompts) == 4
+    assert answer_cache.stats.hits == 1
@@ -0,0 +1,98 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Iterator, Tuple
+from urllib.parse import urlparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from holosophos import http_client
+from holosophos.utils import download_pdf
+from holosophos.files import WORKSPACE_DIR_PATH
+
+PDF_CONTENT = (WORKSPACE_DIR_PATH / "2401.12474.pdf").read_bytes()
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        content = PDF_CONTENT if self.path == "/paper.pdf" else b"<html></html>"
+        content_type = "application/pdf" if self.path == "/paper.pdf" else "text/html"
+        start = 0
+        range_header = self.headers.get("Range")
+        if range_header:
+            start = int(range_header.split("=")[1].split("-")[0])
+            if start >= len(content):
+                self.send_response(416)
+                self.end_headers()
+                return
+            self.send_response(206)
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(content) - start))
+        self.end_headers()
+        self.wfile.write(content[start:])
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+
+@pytest.fixture
+def server_url() -> Iterator[str]:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    address: Tuple[str, int] = server.server_address  # type: ignore
+    yield f"http://{address[0]}:{address[1]}"
+    server.shutdown()
+
+
+def test_download_pdf(server_url: str, tmp_path: Path) -> None:
+    output_path = tmp_path / "paper.pdf"
+    download_pdf(f"{server_url}/paper.pdf", output_path)
+    assert output_path.read_bytes() == PDF_CONTENT
+    assert not (tmp_path / "paper.pdf.part").exists()
+
+
+def test_download_pdf_resume(server_url: str, tmp_path: Path) -> None:
+    output_path = tmp_path / "paper.pdf"
+    (tmp_path / "paper.pdf.part").write_bytes(PDF_CONTENT[:1000])
+    download_pdf(f"{server_url}/paper.pdf", output_path)
+    assert output_path.read_bytes() == PDF_CONTENT
+
+
+def test_download_pdf_restart(server_url: str, tmp_path: Path) -> None:
+    # The whole file is in the ".part" file, so the server answers 416
+    output_path = tmp_path / "paper.pdf"
+    (tmp_path / "paper.pdf.part").write_bytes(PDF_CONTENT)
+    http_client.configure(host_concurrency={urlparse(server_url).netloc: 1})
+    thread = threading.Thread(
+        target=download_pdf, args=(f"{server_url}/paper.pdf", output_path), daemon=True
+    )
+    thread.start()
+    thread.join(timeout=10)
+    assert not thread.is_alive()
+    assert output_path.read_bytes() == PDF_CONTENT
+
+
+def test_download_pdf_limits(server_url: str, tmp_path: Path) -> None:
+    output_path = tmp_path / "paper.pdf"
+    with pytest.raises(AssertionError):
+        download_pdf(f"{server_url}/paper.pdf", output_path, max_size=1000)
+    with pytest.raises(AssertionError):
+        download_pdf(f"{server_url}/page.html", output_path)
+    assert not output_path.exists()
+    assert not (tmp_path / "paper.pdf.part").exists()
+
+
+def test_download_pdf_concurrent(server_url: str, tmp_path: Path) -> None:
+    output_path = tmp_path / "paper.pdf"
+    url = f"{server_url}/paper.pdf"
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(download_pdf, url, output_path) for _ in range(4)]
+        for future in futures:
+            future.result()
+    assert output_path.read_bytes() == PDF_CONTENT
+    assert not (tmp_path / "paper.pdf.part").exists()
+    assert not list(tmp_path.glob("*.lock"))
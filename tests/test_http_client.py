@@ -0,0 +1,26 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from holosophos import http_client
+
+
+def test_http_client_shared_pool() -> None:
+    session = http_client.get_session()
+    assert http_client.get_session() is session
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        other_session = executor.submit(http_client.get_session).result()
+    assert other_session is not session
+    assert other_session.get_adapter("https://") is session.get_adapter("http://")
+
+
+def test_http_client_configure() -> None:
+    session = http_client.get_session()
+    http_client.configure(pool_maxsize=4, host_concurrency={"example.org": 1})
+    new_session = http_client.get_session()
+    assert new_session is not session
+    assert new_session.get_adapter("https://") is not session.get_adapter("https://")
+    assert http_client.POOL_MAXSIZE == 4
+    with http_client.host_slot("https://example.org/a"):
+        semaphore = http_client._host_semaphores["example.org"]
+        assert not semaphore.acquire(blocking=False)
+    http_client.configure(pool_maxsize=16)
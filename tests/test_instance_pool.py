@@ -0,0 +1,34 @@
+import time
+import subprocess
+from pathlib import Path
+
+from holosophos.instance_pool import InstancePool
+
+
+def test_instance_pool_lease(tmp_path: Path) -> None:
+    pool = InstancePool(tmp_path / "pool.json", idle_ttl=100)
+    pool.add(1, {"instance_id": 1})
+    assert pool.lease() is None
+    assert pool.count_free() == 0
+
+    pool.release(1)
+    assert pool.count_free() == 1
+    assert pool.lease() == {"instance_id": 1}
+    assert pool.lease() is None
+    assert pool.reap() == []
+
+
+def test_instance_pool_dead_process(tmp_path: Path) -> None:
+    pool = InstancePool(tmp_path / "pool.json", idle_ttl=0)
+    process = subprocess.Popen(["true"])
+    process.wait()
+    pool.add(1, {"instance_id": 1})
+    pool.add(2, {"instance_id": 2})
+    with pool._locked() as entries:
+        entries["1"]["leased_by"] = process.pid
+
+    assert pool.count_free() == 1
+    assert pool.reap() == []
+    time.sleep(0.01)
+    assert pool.reap() == [{"instance_id": 1}]
+    assert pool.count_free() == 0
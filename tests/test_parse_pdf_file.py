@@ -0,0 +1,32 @@
+from pathlib import Path
+
+import pytest
+
+from holosophos import utils
+from holosophos.cache import DiskCache
+from holosophos.utils import parse_pdf_file
+from holosophos.files import WORKSPACE_DIR_PATH
+
+
+def test_parse_pdf_file_parallel() -> None:
+    pdf_path = WORKSPACE_DIR_PATH / "2024.emnlp-main.695.pdf"
+    pages = parse_pdf_file(pdf_path, num_workers=1, use_cache=False)
+    assert len(pages) == 24
+    assert pages[0].startswith("## Page 1\n\n")
+    assert "The Mystery of the Pathological Path-star Task" in pages[0]
+
+    parallel_pages = parse_pdf_file(pdf_path, num_workers=3, use_cache=False)
+    assert parallel_pages == pages
+
+
+def test_parse_pdf_file_cache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    cache = DiskCache(tmp_path / "cache.sqlite")
+    monkeypatch.setattr(utils, "_pdf_text_cache", cache)
+    pdf_path = WORKSPACE_DIR_PATH / "2401.12474.pdf"
+    pages = parse_pdf_file(pdf_path)
+    assert cache.stats.misses == 1
+
+    copy_path = tmp_path / "copy.pdf"
+    copy_path.write_bytes(pdf_path.read_bytes())
+    assert parse_pdf_file(copy_path) == pages
+    assert cache.stats.hits == 1
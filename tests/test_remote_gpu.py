@@ -0,0 +1,435 @@
+import os
+import time
+import shutil
+import socket
+import threading
+import importlib
+import subprocess
+from pathlib import Path
+from collections import Counter
+from typing import Any, Dict, Iterator, List
+
+import pytest
+
+from holosophos.instance_pool import InstancePool
+from holosophos.shell import ProcessShellSession
+
+remote_gpu = importlib.import_module("holosophos.tools.remote_gpu")
+text_editor = importlib.import_module("holosophos.tools.text_editor")
+InstanceInfo = remote_gpu.InstanceInfo
+
+
+def _make_instance() -> Any:
+    return InstanceInfo(
+        instance_id=1,
+        ip="127.0.0.1",
+        port=2222,
+        username="root",
+        ssh_key_path="/tmp/id_rsa",
+        control_path="/tmp/holosophos-ssh-%C",
+    )
+
+
+def test_remote_gpu_ssh_multiplexing(monkeypatch: pytest.MonkeyPatch) -> None:
+    calls: List[List[str]] = []
+    return_codes = [255, 0, 0, 255]
+    check_codes = [255, 0]
+
+    def fake_run(cmd: List[str], **kwargs: Any) -> "subprocess.CompletedProcess[str]":
+        calls.append(cmd)
+        code = return_codes.pop(0) if "-O" not in cmd else 0
+        if "check" in cmd:
+            code = check_codes.pop(0)
+        return subprocess.CompletedProcess(cmd, code, stdout="ok", stderr="")
+
+    monkeypatch.setattr(remote_gpu.subprocess, "run", fake_run)
+    instance = _make_instance()
+    assert remote_gpu.run_command(instance, "echo ok").stdout == "ok"
+    assert len(calls) == 4
+    assert "ControlMaster=auto" in calls[0]
+    assert "ControlPath=/tmp/holosophos-ssh-%C" in calls[0]
+    assert calls[1][-3:] == ["-O", "check", "root@127.0.0.1"]
+    assert calls[2][-3:] == ["-O", "exit", "root@127.0.0.1"]
+    assert calls[3] == calls[0]
+
+    remote_gpu.run_command(instance, "echo ok")
+    assert len(calls) == 5
+
+    # The command exits with 255 over a working connection and is not rerun
+    with pytest.raises(Exception):
+        remote_gpu.run_command(instance, "exit 255")
+    assert len(calls) == 7
+    assert calls[6][-3:] == ["-O", "check", "root@127.0.0.1"]
+
+
+@pytest.fixture
+def local_instance(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[Any]:
+    # Remote commands are executed by the local bash
+    def run_local(
+        instance: Any, command: str, timeout: int = 60
+    ) -> "subprocess.CompletedProcess[str]":
+        result = subprocess.run(
+            ["bash", "-c", command], capture_output=True, text=True, timeout=timeout
+        )
+        assert result.returncode == 0, result.stderr
+        return result
+
+    (tmp_path / "workspace").mkdir()
+    session = remote_gpu.RemoteSession(remote_gpu.InstanceScheduler())
+    session.instance = _make_instance()
+    session.workdir = str(tmp_path)
+    session.shell = ProcessShellSession(["bash"])
+    monkeypatch.setattr(remote_gpu, "WORKSPACE_DIR_PATH", tmp_path / "workspace")
+    monkeypatch.setattr(remote_gpu, "_default_session", session)
+    monkeypatch.setattr(remote_gpu, "run_command", run_local)
+    yield session
+    if session.shell:
+        session.shell.close()
+
+
+def _wait_for_status(job_id: str, status: str) -> None:
+    for _ in range(100):
+        if remote_gpu.remote_job_status(job_id) == status:
+            return
+        time.sleep(0.1)
+    assert remote_gpu.remote_job_status(job_id) == status
+
+
+def test_remote_gpu_jobs(local_instance: Any) -> None:
+    job_id = remote_gpu.remote_start_job("echo hello; sleep 0.3; echo 'done'; exit 3")
+    _wait_for_status(job_id, "finished with exit code 3")
+    output = remote_gpu.remote_job_output(job_id)
+    assert output.endswith("\nhello\ndone\n")
+    assert "next offset: 11" in output
+    output = remote_gpu.remote_job_output(job_id, offset=6, max_bytes=2)
+    assert "output bytes 6-8 of 11" in output
+    assert output.endswith("\ndo")
+
+
+def test_remote_gpu_cancel_job(local_instance: Any, tmp_path: Path) -> None:
+    job_id = remote_gpu.remote_start_job("echo started; sleep 30 | cat")
+    assert remote_gpu.remote_job_status(job_id) == "running"
+    assert remote_gpu.remote_cancel_job(job_id) == "cancelled"
+    job_dir = tmp_path / remote_gpu.JOBS_DIR_NAME / job_id
+    process_group = int((job_dir / "pid").read_text())
+    for _ in range(50):
+        try:
+            os.killpg(process_group, 0)
+        except ProcessLookupError:
+            break
+        time.sleep(0.1)
+    else:
+        raise AssertionError("The job is still running")
+
+
+def test_remote_gpu_text_editor_sync(
+    local_instance: Any, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    local_dir = tmp_path / "local"
+    local_dir.mkdir()
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "a.py").write_text("x = 1\n")
+    calls: List[str] = []
+
+    def fake_receive(info: Any, remote_path: str, local_path: str) -> None:
+        calls.append("receive")
+        shutil.copy(remote_path, local_path)
+
+    def fake_send(info: Any, local_path: Path, remote_path: str) -> None:
+        calls.append("send")
+        shutil.copy(local_path, remote_path)
+
+    monkeypatch.setattr(remote_gpu, "recieve_rsync", fake_receive)
+    monkeypatch.setattr(remote_gpu, "send_file", fake_send)
+    monkeypatch.setattr(remote_gpu, "WORKSPACE_DIR_PATH", local_dir)
+    monkeypatch.setattr(text_editor, "WORKSPACE_DIR_PATH", local_dir)
+    editor = remote_gpu.create_remote_text_editor(text_editor.text_editor)
+
+    assert "x = 1" in editor("view", "src/a.py")
+    editor("str_replace", "src/a.py", old_str="x = 1", new_str="x = 2")
+    assert "x = 2" in editor("view", "src/a.py")
+    assert calls == ["receive", "send"]
+    assert (tmp_path / "src" / "a.py").read_text() == "x = 2\n"
+    assert (local_instance.mirror_dir / "src" / "a.py").read_text() == "x = 2\n"
+    assert not (local_dir / "src").exists()
+
+    (tmp_path / "src" / "a.py").write_text("x = 3\n")
+    local_instance.invalidate_synced_files()
+    assert "x = 3" in editor("view", "src/a.py")
+    assert calls == ["receive", "send", "receive"]
+
+    # A running job changes the file without bumping the generation
+    job_id = remote_gpu.remote_start_job(
+        f"echo 'x = 4' > {tmp_path}/src/a.py; sleep 30"
+    )
+    for _ in range(50):
+        if (tmp_path / "src" / "a.py").read_text() == "x = 4\n":
+            break
+        time.sleep(0.1)
+    assert "x = 4" in editor("view", "src/a.py")
+    assert "x = 4" in editor("view", "src/a.py")
+    assert calls == ["receive", "send", "receive", "receive", "receive"]
+
+    assert remote_gpu.remote_cancel_job(job_id) == "cancelled"
+    assert "x = 4" in editor("view", "src/a.py")
+    assert "x = 4" in editor("view", "src/a.py")
+    assert calls == ["receive", "send", "receive", "receive", "receive", "receive"]
+
+    local_instance.close()
+    assert not local_instance.mirror_dir.exists()
+
+
+def test_remote_gpu_send_scripts(
+    local_instance: Any, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    calls: List[List[str]] = []
+
+    def fake_send_files(
+        info: Any, local_dir: str, names: List[str], remote_dir: str
+    ) -> None:
+        calls.append(names)
+
+    (tmp_path / "a.py").write_text("a = 1")
+    (tmp_path / "b.py").write_text("b = 1")
+    (tmp_path / "data.txt").write_text("data")
+    monkeypatch.setattr(remote_gpu, "send_files", fake_send_files)
+    monkeypatch.setattr(remote_gpu, "WORKSPACE_DIR_PATH", tmp_path)
+
+    local_instance.send_scripts()
+    local_instance.send_scripts()
+    (tmp_path / "b.py").write_text("b = 2")
+    local_instance.send_scripts()
+    assert calls == [["a.py", "b.py"], ["b.py"]]
+
+
+def test_remote_gpu_editor_then_bash(
+    local_instance: Any, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    local_dir = tmp_path / "workspace"
+    (local_dir / "train.py").write_text("lr = 1\n")
+
+    def fake_send_files(
+        info: Any, local_dir: str, names: List[str], remote_dir: str
+    ) -> None:
+        for name in names:
+            shutil.copy(Path(local_dir) / name, Path(remote_dir) / name)
+
+    def fake_receive(info: Any, remote_path: str, local_path: str) -> None:
+        shutil.copy(remote_path, local_path)
+
+    def fake_send(info: Any, local_path: Path, remote_path: str) -> None:
+        shutil.copy(local_path, remote_path)
+
+    monkeypatch.setattr(remote_gpu, "send_files", fake_send_files)
+    monkeypatch.setattr(remote_gpu, "recieve_rsync", fake_receive)
+    monkeypatch.setattr(remote_gpu, "send_file", fake_send)
+    monkeypatch.setattr(text_editor, "WORKSPACE_DIR_PATH", local_dir)
+    editor = remote_gpu.create_remote_text_editor(text_editor.text_editor)
+
+    editor("str_replace", "train.py", old_str="lr = 1", new_str="lr = 2")
+    assert "lr = 2" in remote_gpu.remote_bash(f"cat {tmp_path}/train.py")
+    assert (local_dir / "train.py").read_text() == "lr = 1\n"
+
+    # A local change of the script is still uploaded
+    (local_dir / "train.py").write_text("lr = 3\n")
+    assert "lr = 3" in remote_gpu.remote_bash(f"cat {tmp_path}/train.py")
+
+
+class FakeVastAI:
+    # Instance ids are offer ids multiplied by 10, SSH ports are equal to instance ids
+    def __init__(self, offers: List[Dict[str, Any]], ready_after: Dict[int, int]):
+        self.offers = offers
+        self.ready_after = ready_after
+        self.created: List[int] = []
+        self.destroyed: List[int] = []
+        self.show_calls: Counter[int] = Counter()
+
+    def search_offers(self, query: str, order: str) -> List[Dict[str, Any]]:
+        return self.offers
+
+    def create_instance(self, id: int, image: str, disk: float) -> Dict[str, Any]:
+        self.created.append(id * 10)
+        return {"success": True, "new_contract": id * 10}
+
+    def show_instance(self, id: int) -> Dict[str, Any]:
+        self.show_calls[id] += 1
+        is_ready = self.show_calls[id] > self.ready_after[id // 10]
+        return {
+            "id": id,
+            "actual_status": "running" if is_ready else "loading",
+            "ssh_host": "127.0.0.1",
+            "ssh_port": id,
+            "gpu_name": "RTX_3090",
+        }
+
+    def attach_ssh(self, instance_id: int, ssh_key: str) -> None:
+        pass
+
+    def destroy_instance(self, id: int) -> None:
+        self.destroyed.append(id)
+
+
+@pytest.fixture
+def fake_provisioning(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    def fake_run_command(
+        instance: Any, command: str, timeout: int = 60
+    ) -> "subprocess.CompletedProcess[str]":
+        if instance.port != 20:
+            raise Exception("Connection refused")
+        return subprocess.CompletedProcess([], 0, stdout=command[6:-1], stderr="")
+
+    (tmp_path / "id_rsa").write_text("private")
+    (tmp_path / "id_rsa.pub").write_text("public")
+    monkeypatch.setattr(remote_gpu, "SSH_KEY_PATH", tmp_path / "id_rsa")
+    monkeypatch.setattr(remote_gpu, "POLL_INITIAL_INTERVAL", 0.005)
+    monkeypatch.setattr(remote_gpu, "POLL_MAX_INTERVAL", 0.01)
+    monkeypatch.setattr(remote_gpu, "SSH_READY_TIMEOUT", 0.05)
+    monkeypatch.setattr(remote_gpu, "is_port_open", lambda host, port: port >= 20)
+    monkeypatch.setattr(remote_gpu, "run_command", fake_run_command)
+    monkeypatch.setattr(remote_gpu, "close_connection", lambda instance: None)
+
+
+def test_remote_gpu_launch_instance_race(fake_provisioning: None) -> None:
+    offers = [{"id": i, "dph_total": 0.5} for i in (1, 2, 3, 4)]
+    sdk = FakeVastAI(offers, ready_after={1: 10**6, 2: 30, 3: 0, 4: 0})
+    info = remote_gpu.launch_instance(sdk, "RTX_3090", fan_out=3)
+    assert info is not None
+    assert info.port == 20
+    assert sorted(sdk.created) == [10, 20, 30, 40]
+    assert sorted(sdk.destroyed) == [10, 30, 40]
+    assert not remote_gpu._launched_instance_ids
+    stages = list(info.stage_timings)
+    assert stages == ["provisioning", "running", "ssh_ready"]
+
+
+def test_remote_gpu_launch_instance_budget(fake_provisioning: None) -> None:
+    offers = [{"id": 5, "dph_total": 3.0}, {"id": 1, "dph_total": 1.0}]
+    offers += [{"id": 2, "dph_total": 1.0}, {"id": 3, "dph_total": 1.0}]
+    sdk = FakeVastAI(offers, ready_after={1: 10**6, 2: 0, 3: 0})
+    info = remote_gpu.launch_instance(sdk, "RTX_3090", fan_out=3, max_dph=2.5)
+    assert info is not None
+    assert info.port == 20
+    assert sdk.created == [10, 20]
+    assert sdk.destroyed == [10]
+
+
+def test_remote_gpu_launch_instance_failure(fake_provisioning: None) -> None:
+    class BrokenVastAI(FakeVastAI):
+        def attach_ssh(self, instance_id: int, ssh_key: str) -> None:
+            raise Exception("API error")
+
+    offers = [{"id": i, "dph_total": 0.5} for i in (1, 2)]
+    sdk = BrokenVastAI(offers, ready_after={1: 0, 2: 0})
+    assert remote_gpu.launch_instance(sdk, "RTX_3090", fan_out=2) is None
+    assert sorted(sdk.destroyed) == [10, 20]
+    assert not remote_gpu._launched_instance_ids
+
+
+def test_remote_gpu_readiness_probes() -> None:
+    intervals = remote_gpu.poll_intervals()
+    assert [next(intervals) for _ in range(6)] == [1.0, 2.0, 4.0, 8.0, 8.0, 8.0]
+
+    with socket.socket() as server:
+        server.bind(("127.0.0.1", 0))
+        server.listen()
+        port = server.getsockname()[1]
+        assert remote_gpu.is_port_open("127.0.0.1", port)
+    assert not remote_gpu.is_port_open("127.0.0.1", port)
+
+
+def test_remote_gpu_instance_pool(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    commands: List[str] = []
+
+    def fake_run_command(
+        instance: Any, command: str, timeout: int = 60
+    ) -> "subprocess.CompletedProcess[str]":
+        commands.append(command)
+        return subprocess.CompletedProcess([], 0, stdout="", stderr="")
+
+    pool = InstancePool(tmp_path / "pool.json", idle_ttl=100)
+    monkeypatch.setattr(remote_gpu, "_pool", pool)
+    monkeypatch.setattr(remote_gpu, "INSTANCE_POOL_SIZE", 1)
+    monkeypatch.setattr(remote_gpu, "run_command", fake_run_command)
+    sdk = FakeVastAI([], ready_after={})
+    first, second = _make_instance(), _make_instance()
+    second.instance_id = 2
+    pool.add(first.instance_id, remote_gpu.asdict(first))
+    pool.add(second.instance_id, remote_gpu.asdict(second))
+
+    remote_gpu.release_instance(sdk, first)
+    remote_gpu.release_instance(sdk, second)
+    assert sdk.destroyed == [2]
+
+    leased = remote_gpu.lease_instance(sdk)
+    assert leased is not None
+    assert leased.instance_id == 1
+    assert leased.port == first.port
+    assert commands == [remote_gpu.reset_workdir_command("/root")]
+    assert remote_gpu.lease_instance(sdk) is None
+
+
+@pytest.fixture
+def fake_scheduling(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> List[str]:
+    commands: List[str] = []
+    instance_ids = iter(range(1, 100))
+
+    def fake_provision_instance(gpu_name: str, num_gpus: int) -> Any:
+        instance = _make_instance()
+        instance.instance_id = next(instance_ids)
+        return instance
+
+    def fake_run_command(
+        instance: Any, command: str, timeout: int = 60
+    ) -> "subprocess.CompletedProcess[str]":
+        commands.append(command)
+        return subprocess.CompletedProcess([], 0, stdout="", stderr="")
+
+    monkeypatch.setattr(remote_gpu, "WORKSPACE_DIR_PATH", tmp_path)
+    monkeypatch.setattr(remote_gpu, "provision_instance", fake_provision_instance)
+    monkeypatch.setattr(remote_gpu, "run_command", fake_run_command)
+    return commands
+
+
+def test_remote_gpu_scheduler_queue(fake_scheduling: List[str]) -> None:
+    scheduler = remote_gpu.InstanceScheduler(max_instances=1)
+    first = remote_gpu.RemoteSession(scheduler)
+    second = remote_gpu.RemoteSession(scheduler)
+    assert first.get_instance().instance_id == 1
+
+    waiting = threading.Thread(target=second.get_instance)
+    waiting.start()
+    waiting.join(timeout=0.2)
+    assert waiting.is_alive()
+
+    first.close()
+    waiting.join(timeout=5)
+    assert not waiting.is_alive()
+    assert second.instance is not None
+    assert second.instance.instance_id == 1
+    assert second.workdir == "/root"
+    assert fake_scheduling == [remote_gpu.reset_workdir_command("/root")]
+    second.close()
+
+
+def test_remote_gpu_scheduler_shared_instance(fake_scheduling: List[str]) -> None:
+    scheduler = remote_gpu.InstanceScheduler(max_instances=2, sessions_per_instance=2)
+    sessions = [remote_gpu.RemoteSession(scheduler) for _ in range(3)]
+    instances = [session.get_instance() for session in sessions]
+    assert [instance.instance_id for instance in instances] == [1, 1, 2]
+    assert [session.slot for session in sessions] == [0, 1, 0]
+    workdir = f"/root/sessions/{sessions[1].session_id}"
+    assert sessions[1].workdir == workdir
+    assert sessions[1].jobs_dir == f"{workdir}/.holosophos_jobs"
+    shell = sessions[1].get_shell()
+    assert shell.init_command.endswith("&& export CUDA_VISIBLE_DEVICES=1")
+
+    sessions[1].close()
+    assert fake_scheduling[-1].endswith(f"; rm -rf {workdir}")
+    assert scheduler.sessions[1] == {0: sessions[0]}
+
+    bound_session = remote_gpu.bind_remote_tool(
+        lambda: remote_gpu.get_session().session_id, sessions[2]
+    )
+    assert bound_session() == sessions[2].session_id
@@ -0,0 +1,70 @@
+import time
+
+import pytest
+
+from holosophos.shell import ProcessShellSession
+
+
+def test_shell_session_state() -> None:
+    session = ProcessShellSession(["bash"])
+    try:
+        assert session.run("cd /tmp && export HS_TEST=42") == ("", 0)
+        assert session.run("pwd; echo $HS_TEST") == ("/tmp\n42\n", 0)
+        assert session.run("echo 'quotes \"and\" $HS_TEST'; false") == (
+            'quotes "and" $HS_TEST\n',
+            1,
+        )
+        assert session.run("echo error >&2; cat") == ("error\n", 0)
+        assert session.run("printf no_newline") == ("no_newline", 0)
+    finally:
+        session.close()
+
+
+def test_shell_session_timeout() -> None:
+    session = ProcessShellSession(["bash"])
+    try:
+        session.run("cd /tmp")
+        start_time = time.monotonic()
+        with pytest.raises(TimeoutError):
+            session.run("echo started; sleep 30 | cat", timeout=1)
+        assert time.monotonic() - start_time < 10
+        assert session.run("pwd") == ("/tmp\n", 0)
+    finally:
+        session.close()
+
+
+def test_shell_session_timeout_keeps_background_jobs() -> None:
+    session = ProcessShellSession(["bash"])
+    try:
+        session.run("sleep 30 | cat &")
+        with pytest.raises(TimeoutError):
+            session.run("sleep 30", timeout=1)
+        assert session.run("jobs -r | wc -l") == ("1\n", 0)
+        session.run("kill %1")
+    finally:
+        session.close()
+
+
+def test_shell_session_restart() -> None:
+    session = ProcessShellSession(["bash"])
+    try:
+        session.run("export HS_TEST=42")
+        with pytest.raises(EOFError):
+            session.run("exit 3")
+        assert session.run("echo ${HS_TEST:-empty}") == ("empty\n", 0)
+    finally:
+        session.close()
+
+
+def test_shell_session_output_limit() -> None:
+    session = ProcessShellSession(["bash"], max_output_size=1000)
+    try:
+        output, exit_code = session.run("seq 1 10000; echo done")
+        assert exit_code == 0
+        assert output.startswith("1\n2\n3\n")
+        assert output.endswith("9999\n10000\ndone\n")
+        assert "bytes truncated ...]" in output
+        assert len(output) < 1100
+        assert session.run("echo ok") == ("ok\n", 0)
+    finally:
+        session.close()